@@ -1,11 +1,344 @@
-import yaml
+"""
+config.py
+配置读取与保存
+
+config.config 在第一次访问属性时才读取配置文件，导入本模块不做任何文件 IO。
+配置文件按以下顺序查找：
+
+    1. Config(path) 或 config.config.reload(path) 显式指定的路径
+    2. 环境变量 IOSREALRUN_CONFIG
+    3. 当前目录下的 config.yaml
+    4. 项目目录下的 config.yaml
+
+环境变量 IOSREALRUN_<配置项大写> 可以覆盖文件中的值，例如 IOSREALRUN_V=4.0、
+IOSREALRUN_ROUTECONFIG=routes/a.json。
+
+PATH_KEYS 中的相对路径：写在配置文件里的相对于配置文件所在目录，来自环境变量的相对于
+当前目录，读取后都是绝对路径，与从哪个目录启动无关。config.config 的值包含环境变量覆盖，
+只应用于运行；需要写回文件的修改用 ConfigStore，它只读写文件中的值。
+"""
+import os
+import time
+import logging
+import threading
+
+CONFIG_FILE = "config.yaml"
+CONFIG_ENV = "IOSREALRUN_CONFIG"
+ENV_PREFIX = "IOSREALRUN_"
+
+logger = logging.getLogger(__name__)
+
+# 配置项 -> (允许的类型, 是否必填)；未列出的配置项原样保留
+SCHEMA = {
+    "v": ((int, float), True),
+    "routeConfig": (str, True),
+    "libimobiledeviceDir": (str, False),
+    "imageDir": (str, False),
+    "simplifyTolerance": ((int, float), False),
+    "paceProfile": ((str, list, dict), False),
+    "journalDir": (str, False),
+    "eventLog": (str, False),
+    "logLevel": (str, False),
+}
+# 值为文件或目录路径的配置项
+PATH_KEYS = ("routeConfig", "journalDir", "eventLog", "paceProfile")
+
+
+def validate(data, partial=False):
+    """
+    按 SCHEMA 检查配置
+
+    Args:
+        data: 配置字典
+        partial: 只检查 data 中出现的配置项，不要求必填项
+
+    Raises:
+        ValueError: 配置不合法
+    """
+    if not isinstance(data, dict):
+        raise ValueError("配置文件内容必须是键值对")
+    for key, (types, required) in SCHEMA.items():
+        if key not in data or data[key] is None:
+            if required and not partial:
+                raise ValueError(f"缺少配置项: {key}")
+            continue
+        value = data[key]
+        # bool 是 int 的子类，这里不接受
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ValueError(f"配置项 {key} 的类型错误: {value!r}")
+
+
+def resolve_path(path=None):
+    """按查找顺序确定配置文件的绝对路径"""
+    if path:
+        return os.path.abspath(path)
+    if os.environ.get(CONFIG_ENV):
+        return os.path.abspath(os.environ[CONFIG_ENV])
+    if os.path.exists(CONFIG_FILE):
+        return os.path.abspath(CONFIG_FILE)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_FILE)
+
+
+def env_overrides(environ=None):
+    """
+    读取环境变量中的配置覆盖
+
+    数值类型的配置项转换为 int/float，可以是字符串的配置项（包括路径）原样使用；
+    只能是列表/字典的配置项不能用环境变量覆盖。某个环境变量的值不合法时只忽略
+    该配置项并记录警告，不影响其他配置项。
+
+    Returns:
+        {配置项: 值}
+    """
+    environ = os.environ if environ is None else environ
+    overrides = {}
+    for key, (types, _) in SCHEMA.items():
+        name = ENV_PREFIX + key.upper()
+        value = environ.get(name)
+        if value is None:
+            continue
+        types = types if isinstance(types, tuple) else (types,)
+        if str in types:
+            overrides[key] = value
+        elif int in types or float in types:
+            try:
+                overrides[key] = int(value)
+            except ValueError:
+                try:
+                    overrides[key] = float(value)
+                except ValueError:
+                    logger.warning(f"环境变量 {name} 不是数字，已忽略: {value!r}")
+        else:
+            logger.warning(f"配置项 {key} 不能用环境变量覆盖，已忽略 {name}")
+    return overrides
+
+
+def resolve_paths(data, base):
+    """
+    把 data 中 PATH_KEYS 的相对路径改为相对于 base 目录的绝对路径
+
+    不是字符串的值（例如直接写在配置里的配速方案）和 shm:// 之类的地址不变。
+
+    Returns:
+        新的字典
+    """
+    data = dict(data)
+    for key in PATH_KEYS:
+        value = data.get(key)
+        if isinstance(value, str) and value and "://" not in value:
+            data[key] = os.path.normpath(os.path.join(base, os.path.expanduser(value)))
+    return data
+
+
+def load_file(path=None):
+    """读取并校验配置文件"""
+    import yaml
+    path = resolve_path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    validate(data)
+    return data
+
+
+def write_file(path, data):
+    """
+    原子写入：先写同目录下的临时文件再替换，进程被杀也不会留下半个文件
+
+    mkstemp 创建的临时文件权限为 0600，替换已有文件时先改为原文件的权限。
+    """
+    import stat
+    import tempfile
+    import yaml
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+    fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+    try:
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yaml.dump(data, f, default_flow_style=False, allow_unicode=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 class Config:
-    def __init__(self):
-        with open("config.yaml", 'r') as f:
-            config = yaml.safe_load(f)
-        for i in config:
-            setattr(self, i, config[i])
+    """
+    延迟加载的配置
+
+    第一次访问属性时读取配置文件并叠加环境变量覆盖，之后使用缓存；
+    配置项不存在时抛出 AttributeError，因此可以配合 getattr/hasattr 使用。
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return resolve_path(self._path)
+
+    def load(self):
+        """读取配置（已读取过则直接返回缓存）"""
+        with self._lock:
+            if self._data is None:
+                path = self.path
+                data = resolve_paths(load_file(path), os.path.dirname(path))
+                data.update(resolve_paths(env_overrides(), os.getcwd()))
+                validate(data)
+                self._data = data
+            return self._data
+
+    def reload(self, path=None):
+        """丢弃缓存重新读取，可同时切换配置文件"""
+        with self._lock:
+            if path is not None:
+                self._path = path
+            self._data = None
+        return self.load()
+
+    def invalidate(self):
+        """丢弃缓存，下次访问时重新读取"""
+        with self._lock:
+            self._data = None
+
+    def as_dict(self):
+        """生效的配置（包含环境变量覆盖、路径已解析），不要原样写回文件"""
+        return dict(self.load())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.load()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class ConfigStore:
+    """
+    配置保存器
+
+    update 只修改内存中的配置并推迟写入，后台线程在最后一次修改 delay 秒后
+    写一次文件；内容与上次写入的相同时不写。文件 IO 不会占用调用方（界面）线程。
+    """
+
+    def __init__(self, path=None, delay=1.0, on_save=None, on_error=None):
+        """
+        Args:
+            path: 配置文件路径，默认与 config.config 相同
+            delay: 推迟写入的秒数
+            on_save: 写入成功后在后台线程中调用，参数为写入的配置
+            on_error: 写入失败时在后台线程中调用，参数为异常
+        """
+        self.path = config.path if path is None else resolve_path(path)
+        self.delay = delay
+        self.on_save = on_save
+        self.on_error = on_error
+        try:
+            self.data = load_file(self.path)
+        except FileNotFoundError:
+            self.data = {}
+        self.written = dict(self.data)
+        self.deadline = None
+        self.error = None
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._writer, name="config-writer", daemon=True)
+        self.thread.start()
+
+    def get(self, key, default=None):
+        with self.cond:
+            return self.data.get(key, default)
+
+    def update(self, **values):
+        """
+        修改配置，推迟写入
+
+        Returns:
+            是否与已写入的配置不同
+        """
+        validate(values, partial=True)
+        with self.cond:
+            self.data.update(values)
+            if self.data == self.written:
+                self.deadline = None
+                return False
+            self.deadline = time.monotonic() + self.delay
+            self.cond.notify_all()
+            return True
+
+    def flush(self, timeout=None):
+        """
+        立即写入尚未保存的修改并等待完成
+
+        Returns:
+            是否已成功写入
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if self.data != self.written:
+                self.deadline = time.monotonic()
+                self.error = None
+                self.cond.notify_all()
+            while self.data != self.written and self.error is None and self.thread.is_alive():
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.data == self.written
+
+    def close(self, timeout=5):
+        """写入未保存的修改并结束后台线程"""
+        self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+    def _writer(self):
+        while True:
+            with self.cond:
+                while not self.closed:
+                    if self.deadline is not None:
+                        remaining = self.deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.cond.wait(remaining)
+                    else:
+                        self.cond.wait()
+                if self.closed:
+                    return
+                self.deadline = None
+                snapshot = dict(self.data)
+                if snapshot == self.written:
+                    continue
+
+            try:
+                write_file(self.path, snapshot)
+            except Exception as e:
+                with self.cond:
+                    self.error = e
+                    self.cond.notify_all()
+                if self.on_error:
+                    self.on_error(e)
+                continue
+
+            with self.cond:
+                self.written = snapshot
+                self.cond.notify_all()
+            if self.path == config.path:
+                config.invalidate()
+            if self.on_save:
+                self.on_save(snapshot)
 
 
 config = Config()
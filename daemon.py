@@ -0,0 +1,188 @@
+"""
+daemon.py
+无界面守护模式
+
+通过本地 HTTP（或 Unix socket）接口控制模拟引擎，适合在没有显示器的机器上用脚本驱动：
+
+    GET  /status                          当前状态和最近一次发送的位置
+    POST /start  {"route_file", "speed", "variation", "profile"}   参数均可省略，默认读取 config.yaml
+    POST /stop
+    POST /route  {"route_file"}           切换路径
+    POST /speed  {"speed", "variation"}   修改速度
+
+所有请求和响应都是 JSON。请求体必须是 JSON 对象；profile 为文件路径时只能指向项目目录内的文件。
+"""
+import os
+import json
+import time
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from engine import EngineClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+ACTIVE_STATES = ("starting", "running", "stopping")
+# 通过接口指定的配速方案文件必须位于该目录内
+PROJECT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def check_profile(profile):
+    """
+    检查请求中的配速方案
+
+    Raises:
+        ValueError: profile 是项目目录之外的文件路径
+    """
+    if isinstance(profile, str):
+        path = os.path.realpath(os.path.join(PROJECT_DIR, profile))
+        if os.path.commonpath([path, PROJECT_DIR]) != PROJECT_DIR:
+            raise ValueError(f"配速方案文件必须位于 {PROJECT_DIR} 内")
+        return path
+    return profile
+
+
+class RunDaemon:
+    """守护进程：持有引擎客户端，后台线程负责转发引擎事件"""
+
+    def __init__(self):
+        self.client = EngineClient()
+        self.lock = threading.Lock()
+        self.session = {
+            "route_file": getattr(config.config, "routeConfig", None),
+            "speed": getattr(config.config, "v", 4.2),
+            "variation": 15,
+            "profile": getattr(config.config, "paceProfile", None),
+        }
+        self.alive = True
+
+    def pump_events(self):
+        while self.alive:
+            for kind, data in self.client.poll():
+                if kind == "log":
+                    logger.info(data["message"])
+                elif kind == "status":
+                    logger.info(f"engine state: {data['state']}")
+            time.sleep(0.1)
+
+    def get_status(self):
+        return {"status": self.client.status, "position": self.client.position, "session": self.session}
+
+    def start(self, **changes):
+        changes["profile"] = check_profile(changes.get("profile"))
+        with self.lock:
+            self.session.update({k: v for k, v in changes.items() if v is not None})
+            if not self.session["route_file"]:
+                raise ValueError("未指定路径文件")
+            if self.client.status["state"] in ACTIVE_STATES:
+                raise RuntimeError("模拟已在运行中")
+            # 先标记为 starting，避免连续请求在引擎回复前重复启动
+            self.client.status = {"state": "starting"}
+            self.client.start(
+                self.session["route_file"], self.session["speed"], self.session["variation"], self.session["profile"]
+            )
+            return self.get_status()
+
+    def stop(self):
+        with self.lock:
+            self.client.stop()
+            return self.get_status()
+
+    def update(self, **changes):
+        """修改路径或速度；运行中时由引擎从当前位置重新规划，不需要重启隧道"""
+        with self.lock:
+            changes = {k: v for k, v in changes.items() if v is not None}
+            self.session.update(changes)
+            if self.client.status["state"] in ACTIVE_STATES:
+                self.client.update(**changes)
+            return self.get_status()
+
+    def shutdown(self):
+        self.alive = False
+        self.client.shutdown()
+
+
+def make_handler(daemon: RunDaemon):
+    routes = {
+        ("GET", "/status"): lambda body: daemon.get_status(),
+        ("POST", "/start"): lambda body: daemon.start(
+            route_file=body.get("route_file"), speed=body.get("speed"), variation=body.get("variation"),
+            profile=body.get("profile")
+        ),
+        ("POST", "/stop"): lambda body: daemon.stop(),
+        ("POST", "/route"): lambda body: daemon.update(route_file=body["route_file"]),
+        ("POST", "/speed"): lambda body: daemon.update(speed=body.get("speed"), variation=body.get("variation")),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def _handle(self, method):
+            route = routes.get((method, self.path.split("?")[0]))
+            if route is None:
+                return self._reply(404, {"error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                if not isinstance(body, dict):
+                    return self._reply(400, {"error": "请求体必须是 JSON 对象"})
+                self._reply(200, route(body))
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(409, {"error": str(e)})
+
+        def _reply(self, code, data):
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            # BaseHTTPRequestHandler 需要 (host, port) 形式的客户端地址
+            request, _ = super().get_request()
+            return request, ("unix", 0)
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    """启动守护进程，阻塞直到 Ctrl+C"""
+    daemon = RunDaemon()
+    handler = make_handler(daemon)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        logger.info(f"控制接口监听 unix:{socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        logger.info(f"控制接口监听 http://{host}:{port}")
+
+    threading.Thread(target=daemon.pump_events, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.shutdown()
+        logger.info("守护进程已退出")
@@ -11,11 +11,19 @@ from pymobiledevice3.services.amfi import AmfiService
 
 from pymobiledevice3.exceptions import NoDeviceConnectedError
 
-def get_usbmux_lockdownclient():
+def get_usbmux_lockdownclient(interactive=True):
+    """
+    获取 lockdown 客户端
+
+    interactive 为 False 时（GUI 引擎、守护进程等没有终端的场景），
+    设备未连接或未解锁会直接抛出异常，而不是等待回车
+    """
     while True:
         try:
             lockdown = create_using_usbmux()
-        except NoDeviceConnectedError:
+        except NoDeviceConnectedError as e:
+            if not interactive:
+                raise RuntimeError("未检测到设备，请连接设备后重试") from e
             print("请连接设备后按回车...")
             input()
         else:
@@ -23,6 +31,8 @@ def get_usbmux_lockdownclient():
     while True:
         lockdown = create_using_usbmux()
         if lockdown.all_values.get("PasswordProtected"):
+            if not interactive:
+                raise RuntimeError("设备已锁定，请解锁设备后重试")
             print("请解锁设备后按回车...")
             input()
         else:
@@ -0,0 +1,597 @@
+"""
+engine.py
+跑步模拟引擎
+
+初始化、隧道和模拟循环都运行在独立的引擎进程中，GUI 等前端只通过两个队列
+与其通信：commands 发送 (命令, 参数)，events 接收 (事件, 数据)。
+这样 Tk 重绘、GC 和 GIL 都不会影响发送位置的节奏。
+
+命令：
+    ("start", {"route_file", "speed", "variation", "profile"})   profile 为配速方案，可省略
+    ("stop", {})
+    ("update", {"route_file", "speed", "variation"})   运行中修改，均可省略
+    ("status", {})
+    ("shutdown", {})
+
+事件：
+    ("log", {"message"})
+    ("status", {"state", ...})       state: idle / starting / running / stopping / error
+    ("position", {"lat", "lng", "lap", "tick"})
+    ("lap", {"lap", "target", "mean", "min", "max", "max_deviation", ...})   每圈开始和重新规划时的速度统计
+
+每次发送的位置都记录到会话日志（配置项 journalDir，默认 journals/，见 util/journal.py）。
+日志、状态、每圈统计和 DEBUG 级别的逐 tick 事件以 JSON 行写入 eventLog（默认 logs/events.jsonl，
+见 util/eventlog.py），格式化和写文件在后台线程完成；级别由配置项 logLevel 决定。
+"""
+import time
+import queue
+import logging
+import random
+import threading
+import multiprocessing
+from pathlib import Path
+
+DT = 0.2
+# 切换路径时，新路线距离当前位置超过该值（米）则直接跳到新路线上，不再跑过去
+MAX_TRANSITION = 100
+# 重新规划后用多少个 tick 把原来的随机偏移平滑过渡到新轨迹
+BLEND_TICKS = 25
+JOURNAL_DIR = "journals"
+EVENT_LOG = "logs/events.jsonl"
+# 每隔多少个 tick 检查一次隧道进程是否还在
+TUNNEL_CHECK_TICKS = 25
+
+
+class Engine:
+    """引擎进程中的模拟器，不直接使用，由 engine_main 创建"""
+
+    def __init__(self, commands, events, clock=None):
+        from util.clock import REAL_CLOCK
+
+        self.commands = commands
+        self.events = events
+        # 发送循环的时钟，测试时可以换成 VirtualClock
+        self.clock = clock or REAL_CLOCK
+        self.running = False
+        self.alive = True
+        self.sessions = queue.Queue()
+        self.status = {"state": "idle"}
+        self.logger = logging.getLogger("iosrealrun.engine")
+        # 配速方案编译出的逐圈位置表，按顺序使用
+        self.pace = None
+        self.pace_tables = []
+        # 后台规划下一圈
+        self.planner = None
+        self.upcoming = None
+        self.plan_version = 0
+        # 已映射的共享内存路径（shm://名字 -> SharedRoute）
+        self.shared_routes = {}
+        self.route_file = None
+        self.journal = None
+        self.tunnel_process = None
+        # 运行中收到的修改，由发送循环在下一个 tick 取走
+        self.changes = {}
+        self.changes_lock = threading.Lock()
+
+    def emit(self, kind, **data):
+        self.events.put((kind, data))
+
+    def log(self, message):
+        self.logger.info(message)
+        self.emit("log", message=message)
+
+    def set_status(self, state, **data):
+        from util.eventlog import event
+
+        self.status = {"state": state, **data}
+        event(self.logger, "status", **self.status)
+        self.emit("status", **self.status)
+
+    def serve(self):
+        """主线程执行模拟会话，命令由后台线程读取，保证停止命令能及时生效"""
+        threading.Thread(target=self._command_loop, daemon=True).start()
+        while self.alive:
+            try:
+                args = self.sessions.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.run_session(**args)
+
+    def _command_loop(self):
+        while self.alive:
+            command, args = self.commands.get()
+            if command == "start":
+                if self.running or self.status["state"] == "starting":
+                    self.log("模拟已在运行中")
+                    continue
+                self.running = True
+                self.set_status("starting")
+                self.sessions.put(args)
+            elif command == "stop":
+                if self.running:
+                    self.running = False
+                    self.set_status("stopping")
+            elif command == "update":
+                self.queue_changes(args)
+            elif command == "status":
+                self.emit("status", **self.status)
+            elif command == "shutdown":
+                self.running = False
+                self.alive = False
+
+    def queue_changes(self, args):
+        """
+        记录运行中的修改
+
+        读取新路径文件在命令线程中完成，发送循环只需要重新规划，不做文件 IO。
+        """
+        if not self.running:
+            return
+        changes = {k: args[k] for k in ("speed", "variation") if args.get(k) is not None}
+        if args.get("route_file"):
+            try:
+                changes["loc"] = self.load_route(args["route_file"])
+                changes["route_file"] = args["route_file"]
+            except Exception as e:
+                self.log(f"加载路径失败: {e}")
+        if changes:
+            with self.changes_lock:
+                self.changes.update(changes)
+
+    def load_route(self, route_file):
+        """
+        读取路径文件，txt 格式会自动转换为 JSON 保存到路径目录
+
+        shm://名字 表示由其他进程发布到共享内存中的路径（见 util/shared_route.py），
+        直接只读映射，不读文件。
+        """
+        from util.shared_route import SCHEME, SharedRoute
+
+        if route_file.startswith(SCHEME):
+            if route_file not in self.shared_routes:
+                self.shared_routes[route_file] = SharedRoute.attach(route_file)
+            coordinates = self.shared_routes[route_file].coordinates()
+            self.log(f"从共享内存 {route_file} 获取路径，共 {len(coordinates)} 个坐标点")
+            return coordinates
+
+        from route_manager import RouteManager
+        manager = RouteManager()
+
+        if not route_file.endswith('.txt'):
+            coordinates = manager.load_route_coordinates(route_file)
+            self.log(f"从 {route_file} 获取路径，共 {len(coordinates)} 个坐标点")
+            return coordinates
+
+        self.log("检测到TXT格式路径文件，正在自动转换...")
+        txt_path = Path(route_file)
+        try:
+            json_path = manager.convert_txt_to_json(
+                route_file, f"{txt_path.stem}_converted", f"从 {txt_path.name} 自动转换"
+            )
+            route_data = manager.load_route_json(json_path)
+            self.log(f"已自动转换为JSON格式: {Path(json_path).name}")
+            self.log(f"路径距离: {route_data['metadata']['distance']:.1f}米")
+            return route_data["coordinates"]
+        except Exception as e:
+            self.log(f"自动转换失败，使用原始TXT格式: {e}")
+            return manager.load_route_coordinates(route_file)
+
+    def run_session(self, route_file, speed, variation, profile=None):
+        import asyncio
+
+        tunnel_process = None
+        final_status = {"state": "idle"}
+        try:
+            from init import init
+            from init import tunnel
+            from util.phases import PhaseTimer
+
+            timer = PhaseTimer(self.log)
+            self.log("开始初始化...")
+            with timer.phase("初始化"):
+                # 引擎进程没有终端，不能等待用户按回车
+                init.init(interactive=False)
+
+            self.log("正在启动隧道...")
+            # 隧道在单独的进程中建立，这里只是等待，不做性能分析
+            with timer.phase("启动隧道", profile=False):
+                tunnel_process, address, port = tunnel.tunnel()
+            if tunnel_process is None:
+                raise RuntimeError(f"隧道建立失败: {tunnel.last_error}")
+            self.tunnel_process = tunnel_process
+            self.log(f"隧道地址: {address}, 端口: {port}")
+
+            with timer.phase("读取路径"):
+                loc = self.load_route(route_file)
+                self.route_file = route_file
+                self.pace = None
+                self.pace_tables = self.compile_profile(profile, loc, speed) if profile else []
+            if self.running:
+                asyncio.run(self._run_async(address, port, loc, speed, variation, route_file, timer))
+        except BaseException as e:
+            # init.init 在检查失败时会调用 sys.exit
+            message = f"退出码 {e.code}" if isinstance(e, SystemExit) else str(e)
+            self.logger.debug("会话异常退出", exc_info=True)
+            self.log(f"运行出错: {message}")
+            final_status = {"state": "error", "error": message}
+        finally:
+            self.running = False
+            self.tunnel_process = None
+            # 配速方案的圈引用共享内存，先丢弃再解除映射
+            self.pace_tables = []
+            for shared in self.shared_routes.values():
+                shared.close()
+            self.shared_routes.clear()
+            if tunnel_process and tunnel_process.is_alive():
+                tunnel.stop(tunnel_process)
+                self.log("隧道进程已终止")
+            self.log("跑步模拟已停止")
+            self.set_status(**final_status)
+
+    def compile_profile(self, profile, loc, speed):
+        """把配速方案编译为逐圈的位置表，发送循环中只按下标取点"""
+        from run import planLap
+        from util.pace import PaceProfile
+
+        start = time.perf_counter()
+        self.pace = PaceProfile.load(profile, speed)
+        path = loc + [loc[0]]
+        dense = self.shared_route()
+        tables = [
+            (base, ticks, self.lap_report(ticks, path[-1], None))
+            for base, ticks in self.pace.compile(path, DT, lambda p, v, dt: planLap(p, v, dt, dense=dense))
+        ]
+        self.log(
+            f"配速方案共 {len(self.pace.phases)} 个阶段，时长 {self.pace.duration / 60:.1f} 分钟，"
+            f"编译为 {len(tables)} 圈，用时 {(time.perf_counter() - start) * 1000:.0f} 毫秒"
+        )
+        return tables
+
+    async def _run_async(self, address, port, loc, speed, variation, route_file, timer=None):
+        from concurrent.futures import ThreadPoolExecutor
+        from run import connectDvt
+        from util.phases import PhaseTimer
+
+        timer = timer or PhaseTimer(self.log)
+        dvt = await connectDvt(address, port, timer)
+        self.log(timer.summary())
+
+        self.loc = loc
+        self.speed = speed
+        self.variation = variation
+        self.route_file = route_file
+        self.set_status("running", route=route_file, speed=speed, variation=variation)
+        if self.pace is not None:
+            self.log("已开始按配速方案模拟跑步")
+        else:
+            self.log(f"已开始模拟跑步，速度大约为 {speed} m/s")
+
+        random.seed(time.time())
+        # 当前圈发送的同时在后台线程规划下一圈，圈与圈之间不需要停下来计算
+        self.planner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lap-planner")
+        self.upcoming = None
+        self.journal = self.open_journal()
+        try:
+            with timer.phase("跑步"):
+                lap = 0
+                while self.running:
+                    lap += 1
+                    current = self.next_plan()
+                    self.prefetch()
+                    self.run_lap(dvt, lap, *current)
+                    if self.pace is not None and not self.pace_tables and self.running:
+                        # 方案结束后按最后的速度匀速继续（下一圈已按该速度规划）
+                        self.speed = self.pace.final_speed
+                        self.pace = None
+                        self.log(f"配速方案已完成，之后按 {self.speed:.2f} m/s 继续")
+                        self.set_status("running", route=self.route_file, speed=self.speed, variation=self.variation)
+                    if self.running:
+                        self.log("跑完一圈了")
+        finally:
+            self.planner.shutdown(wait=False, cancel_futures=True)
+            if self.journal is not None:
+                self.journal.close()
+                self.log(f"发送记录已保存到 {self.journal.path}")
+                self.journal = None
+
+    def open_journal(self):
+        """按配置创建本次会话的日志，失败时只提示，不影响跑步"""
+        import config
+        from util.journal import open_session
+
+        try:
+            return open_session(getattr(config.config, "journalDir", JOURNAL_DIR), DT)
+        except Exception as e:
+            self.log(f"无法创建发送记录: {e}")
+            return None
+
+    def lap_speed(self, speed=None):
+        """按当前速度（或给定的 speed）和变化范围随机生成本圈（或剩余部分）的速度"""
+        speed = self.speed if speed is None else speed
+        return 1000 / (1000 / speed - (2 * random.random() - 1) * self.variation)
+
+    def make_plan(self, path, v):
+        """规划一圈并统计速度，可以在后台线程中执行"""
+        base, ticks = self.plan(path, v, self.shared_route())
+        return path, v, base, ticks, self.lap_report(ticks, path[-1], v)
+
+    def shared_route(self):
+        """当前路径来自共享内存时返回对应的 SharedRoute，否则返回 None"""
+        return self.shared_routes.get(self.route_file)
+
+    def prefetch(self):
+        """在后台线程中规划下一圈（新的随机速度和偏移）"""
+        if self.pace_tables:
+            return  # 下一圈是配速方案中已编译好的表
+        # 配速方案的最后一圈之后按方案的最终速度继续
+        speed = self.pace.final_speed if self.pace is not None else self.speed
+        path = self.loc + [self.loc[0]]
+        self.upcoming = (self.plan_version, self.planner.submit(self.make_plan, path, self.lap_speed(speed)))
+
+    def next_plan(self):
+        """
+        取出下一圈的规划
+
+        通常在上一圈发送期间已经规划好；运行中修改过设置时，预先规划的结果作废，当场重新规划。
+
+        Returns:
+            (path, v, base, ticks, report)，按配速方案的圈 v 为 None
+        """
+        path = self.loc + [self.loc[0]]
+        if self.pace_tables:
+            base, ticks, report = self.pace_tables.pop(0)
+            return path, None, base, ticks, report
+        upcoming, self.upcoming = self.upcoming, None
+        if upcoming is not None:
+            version, future = upcoming
+            if version == self.plan_version:
+                return future.result()
+            future.cancel()
+        return self.make_plan(path, self.lap_speed())
+
+    def plan(self, path, v, dense=None):
+        """
+        规划开放折线 path 的轨迹
+
+        Args:
+            dense: path 为完整一圈且路径来自共享内存时，传入 shared_route() 的结果
+
+        Returns:
+            (未加扰动的位置序列, 加扰动后实际发送的位置序列)
+        """
+        from run import planLap
+
+        return planLap(path, v, DT, dense=dense)
+
+    def lap_report(self, ticks, end, v):
+        """统计本圈（或重新规划后剩余部分）的实际速度"""
+        from util.trajectory import speed_profile
+
+        return speed_profile([*ticks, end], DT, target=v, window=int(round(1 / DT)))
+
+    def report_lap(self, lap, v, report):
+        """发送速度统计，v 为 None 表示按配速方案"""
+        from util.eventlog import event
+
+        event(self.logger, "lap", lap=lap, target=v, **report)
+        self.emit("lap", lap=lap, target=v, **report)
+        target = "按配速方案" if v is None else f"目标速度 {v:.2f} m/s"
+        self.log(
+            f"第 {lap} 圈{target}，实际平均 {report['mean']:.2f} m/s，"
+            f"1 秒内 {report['min']:.2f}~{report['max']:.2f} m/s"
+        )
+
+    def replan(self, changes, path, position, traveled):
+        """
+        应用运行中的修改，从当前位置重新规划本圈剩余的路线
+
+        Args:
+            changes: {"speed", "variation", "loc", "route_file"} 中的任意几项
+            path: 当前规划所用的折线
+            position: 当前（未加扰动的）位置
+            traveled: 在当前折线上已经走过的距离（米）
+
+        Returns:
+            新的折线
+        """
+        from run import remainingPath
+        from util.geometry import nearest_point_on_route, planar_distance
+
+        # 预先规划好的下一圈作废
+        self.plan_version += 1
+        if self.pace is not None:
+            self.pace = None
+            self.pace_tables = []
+            self.log("已退出配速方案，改为匀速")
+        self.speed = changes.get("speed", self.speed)
+        self.variation = changes.get("variation", self.variation)
+        if "loc" in changes:
+            # 从当前位置直线接入新路线上最近的点，再沿新路线跑回起点
+            self.loc = changes["loc"]
+            self.route_file = changes["route_file"]
+            new_path = self.loc + [self.loc[0]]
+            nearest, k = nearest_point_on_route(new_path, position)
+            if planar_distance(position, nearest) > MAX_TRANSITION:
+                path = [nearest] + new_path[k+1:]
+            else:
+                path = [position, nearest] + new_path[k+1:]
+            self.log(f"已切换路径: {self.route_file}")
+        else:
+            path = [position] + remainingPath(path, traveled)[1:]
+        self.log(f"已更新速度: {self.speed:.2f} m/s，变化范围 {self.variation}")
+        self.set_status("running", route=self.route_file, speed=self.speed, variation=self.variation)
+        return path
+
+    def take_changes(self):
+        with self.changes_lock:
+            changes, self.changes = self.changes, {}
+        return changes
+
+    def run_lap(self, dvt, lap, path, v, base, ticks, report):
+        """
+        运行一圈，按绝对时刻发送，停止和修改命令在下一个 tick 生效
+
+        参数为 next_plan 返回的规划结果。
+        """
+        from pymobiledevice3.services.dvt.instruments.location_simulation import LocationSimulation
+        from run import bd09Towgs84
+        from util.eventlog import event
+        from util.trajectory import path_length
+
+        self.report_lap(lap, v, report)
+
+        location = LocationSimulation(dvt)
+        clock = self.clock
+        # 逐 tick 的 DEBUG 事件，未启用时每个 tick 只多一次布尔判断
+        trace = self.logger.isEnabledFor(logging.DEBUG)
+        start = clock.now()
+        tick = 0
+        i = 0
+        while i < len(ticks) and self.running:
+            if tick % TUNNEL_CHECK_TICKS == 0 and self.tunnel_process is not None \
+                    and not self.tunnel_process.is_alive():
+                raise RuntimeError("隧道进程已退出，连接已断开")
+            if self.changes:
+                offset = (ticks[i]["lat"] - base[i]["lat"], ticks[i]["lng"] - base[i]["lng"])
+                path = self.replan(self.take_changes(), path, base[i], path_length(base[:i+1]))
+                v = self.lap_speed()
+                base, ticks = self.plan(path, v)
+                self.prefetch()
+                i = 0
+                if not ticks:
+                    break
+                _blend_offset(ticks, offset)
+                self.report_lap(lap, v, self.lap_report(ticks, path[-1], v))
+            point = bd09Towgs84(ticks[i])
+            sent = time.perf_counter()
+            location.set(point["lat"], point["lng"])
+            latency = time.perf_counter() - sent
+            if self.journal is not None:
+                self.journal.record(lap, tick, point["lat"], point["lng"], latency, clock.wall())
+            if trace:
+                event(self.logger, "tick", logging.DEBUG, lap=lap, tick=tick, lat=point["lat"], lng=point["lng"],
+                      late=clock.now() - start - tick * DT, latency=latency)
+            self.emit("position", lat=ticks[i]["lat"], lng=ticks[i]["lng"], lap=lap, tick=tick)
+            tick += 1
+            i += 1
+            clock.sleep_until(start + tick * DT)
+
+
+def _blend_offset(ticks, offset):
+    """在新轨迹开头叠加逐渐衰减的原随机偏移，避免重新规划时位置跳变"""
+    n = min(BLEND_TICKS, len(ticks))
+    for k in range(n):
+        w = 1 - k / n
+        ticks[k]["lat"] += offset[0] * w
+        ticks[k]["lng"] += offset[1] * w
+
+
+def setup_logging():
+    """
+    引擎进程的日志：全部记录以 JSON 行写入 eventLog，警告以上同时输出到终端
+
+    Returns:
+        QueueListener，退出前调用 stop()
+    """
+    import config
+    from main import QUIET_LOGGERS
+    from util import eventlog
+
+    try:
+        level = str(getattr(config.config, "logLevel", "INFO")).upper()
+        path = getattr(config.config, "eventLog", EVENT_LOG)
+    except Exception:
+        # 配置有问题时开始跑步会报错，这里先按默认值记录
+        level, path = "INFO", EVENT_LOG
+    try:
+        events = eventlog.file_handler(path)
+    except OSError as e:
+        print(f"无法创建事件日志 {path}: {e}")
+        events = None
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    level = logging.getLevelName(level)
+    listener = eventlog.start([console, events], level if isinstance(level, int) else logging.INFO)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return listener
+
+
+def engine_main(commands, events):
+    """引擎进程入口"""
+    listener = setup_logging()
+    try:
+        Engine(commands, events).serve()
+    finally:
+        listener.stop()
+
+
+class EngineClient:
+    """
+    引擎进程的客户端
+
+    前端调用 start/stop 等方法发送命令，并定期调用 poll 取回事件；
+    最近的状态和位置分别保存在 status 和 position 中。
+    """
+
+    def __init__(self):
+        self.commands = multiprocessing.Queue()
+        self.events = multiprocessing.Queue()
+        self.process = None
+        self.status = {"state": "idle"}
+        self.position = None
+
+    def ensure_started(self):
+        # 引擎进程需要创建隧道子进程，因此不能设置为 daemon
+        if self.process is None or not self.process.is_alive():
+            self.process = multiprocessing.Process(
+                target=engine_main, args=(self.commands, self.events), name="iOSRealRun-engine"
+            )
+            self.process.start()
+
+    def send(self, command, **args):
+        self.ensure_started()
+        self.commands.put((command, args))
+
+    def start(self, route_file, speed, variation, profile=None):
+        self.send("start", route_file=route_file, speed=speed, variation=variation, profile=profile)
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.commands.put(("stop", {}))
+
+    def update(self, route_file=None, speed=None, variation=None):
+        """运行中修改路径、速度或变化范围，从当前位置开始生效"""
+        if self.process is not None and self.process.is_alive():
+            self.commands.put(("update", {"route_file": route_file, "speed": speed, "variation": variation}))
+
+    def request_status(self):
+        self.send("status")
+
+    def poll(self, limit=1000):
+        """非阻塞地取回最多 limit 个事件，并更新 status/position"""
+        events = []
+        for _ in range(limit):
+            try:
+                kind, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "status":
+                self.status = data
+            elif kind == "position":
+                self.position = data
+            events.append((kind, data))
+        return events
+
+    def shutdown(self, timeout=5):
+        """停止模拟并结束引擎进程（会等待隧道进程被清理）"""
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.commands.put(("stop", {}))
+            self.commands.put(("shutdown", {}))
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.process = None
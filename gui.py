@@ -1,26 +1,25 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import threading
-import asyncio
 import os
-import signal
+import queue
 import logging
-import coloredlogs
-import json
+import collections
+import threading
 from pathlib import Path
 from datetime import datetime
 
-from init import init
-from init import tunnel
-from init import route
-import run
 import config
+from engine import EngineClient
 from route_manager import RouteManager, RouteManagerGUI
+from map_view import MapCanvas
 
 # 设置 CustomTkinter 外观模式
 ctk.set_appearance_mode("dark")  # 可选: "light", "dark", "system"
 ctk.set_default_color_theme("blue")  # 可选: "blue", "green", "dark-blue"
 
+# 引擎事件轮询间隔（毫秒）
+ENGINE_POLL_INTERVAL = 100
+
 # 定义两套配色方案
 THEME_COLORS = {
     "dark": {
@@ -50,6 +49,49 @@ THEME_COLORS = {
 }
 
 
+class LogSink:
+    """
+    线程安全的日志缓冲
+    
+    任意线程调用 write 只是向 deque 追加一条字符串（CPython 中为原子操作，不加锁），
+    Tk 线程定时批量取出并一次性插入文本框；文本框只保留最近 max_lines 行。
+    """
+    
+    def __init__(self, root, textbox, interval=100, max_lines=2000):
+        self.root = root
+        self.textbox = textbox
+        self.interval = interval
+        self.max_lines = max_lines
+        self._pending = collections.deque()
+        self._lines = 0
+        self.root.after(self.interval, self._drain)
+        
+    def write(self, message):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self._pending.append(f"[{timestamp}] {message}\n")
+        
+    def _drain(self):
+        batch = []
+        try:
+            while True:
+                batch.append(self._pending.popleft())
+        except IndexError:
+            pass
+            
+        if batch:
+            # 超出上限时只插入最后 max_lines 行
+            batch = batch[-self.max_lines:]
+            self.textbox.insert("end", "".join(batch))
+            self._lines += sum(line.count("\n") for line in batch)
+            excess = self._lines - self.max_lines
+            if excess > 0:
+                self.textbox.delete("1.0", f"{excess + 1}.0")
+                self._lines -= excess
+            self.textbox.see("end")
+            
+        self.root.after(self.interval, self._drain)
+
+
 class iOSRealRunGUI:
     def __init__(self, root):
         self.root = root
@@ -59,9 +101,9 @@ class iOSRealRunGUI:
         
         # 运行状态
         self.is_running = False
-        self.tunnel_process = None
-        self.tunnel_address = None
-        self.tunnel_port = None
+        
+        # 模拟引擎（独立进程，首次开始时启动）
+        self.engine = EngineClient()
         
         # 主题状态
         self.current_theme = "dark"
@@ -69,10 +111,23 @@ class iOSRealRunGUI:
         
         # 路径管理器
         self.route_manager = RouteManager()
-        self.route_manager_gui = RouteManagerGUI(root)
+        self.route_manager_gui = RouteManagerGUI(
+            root, simplify_tolerance=getattr(config.config, 'simplifyTolerance', None)
+        )
         
-        # 自动保存定时器
-        self.auto_save_timer = None
+        # 配置保存器（后台线程推迟写入，内容未变化时不写）
+        self.config_store = config.ConfigStore(
+            on_save=lambda data: self.log_message("配置已自动保存"),
+            on_error=lambda e: self.log_message(f"保存配置失败: {e}")
+        )
+        # load_config 填入界面的生效配置（可能来自环境变量覆盖），未修改的不写回文件
+        self.loaded_config = {}
+        # 运行中修改速度的发送定时器
+        self.live_update_timer = None
+        # 地图上当前显示的路径文件
+        self.map_route_file = None
+        # 后台线程交给 Tk 线程执行的回调，由 poll_engine 定时取出（Tk 不是线程安全的）
+        self.ui_calls = queue.Queue()
         
         # 设置日志
         self.setup_logging()
@@ -83,8 +138,12 @@ class iOSRealRunGUI:
         # 加载配置
         self.load_config()
         
+        # 定时接收引擎事件
+        self.root.after(ENGINE_POLL_INTERVAL, self.poll_engine)
+        
     def setup_logging(self):
         """设置日志系统"""
+        import coloredlogs
         self.logger = logging.getLogger(__name__)
         coloredlogs.install(level=logging.INFO)
         self.logger.setLevel(logging.INFO)
@@ -395,6 +454,25 @@ class iOSRealRunGUI:
         )
         route_button.grid(row=1, column=1, padx=(5, 0), pady=(5, 0), sticky="nsew")
         
+        # 路径预览卡片
+        map_card = ctk.CTkFrame(right_column, border_width=2, border_color=THEME_COLORS[self.current_theme]["card_border"])
+        map_card.pack(fill="both", expand=True)
+        self.map_card = map_card  # 保存引用以便主题切换时更新
+        
+        ctk.CTkLabel(
+            map_card,
+            text="🗺️ 路径预览",
+            font=ctk.CTkFont(size=16, weight="bold")
+        ).pack(anchor="w", pady=(15, 10), padx=20)
+        
+        self.map_canvas = MapCanvas(
+            map_card,
+            width=260,
+            height=200,
+            background=THEME_COLORS[self.current_theme]["card_bg"]
+        )
+        self.map_canvas.pack(fill="both", expand=True, padx=20, pady=(0, 15))
+        
         # 底部日志区域（增大占比，增强边框）
         log_card = ctk.CTkFrame(main_container, border_width=2, border_color=THEME_COLORS[self.current_theme]["card_border"])
         log_card.pack(fill="both", expand=True, pady=(15, 0))
@@ -420,6 +498,7 @@ class iOSRealRunGUI:
             wrap="word"
         )
         self.log_text.pack(fill="both", expand=True)
+        self.log_sink = LogSink(self.root, self.log_text)
         
     def update_speed_label(self, value):
         """更新速度标签"""
@@ -427,6 +506,7 @@ class iOSRealRunGUI:
         self.speed_value_label.configure(text=f"{speed:.1f} m/s")
         # 自动保存配置（延迟保存，避免频繁写入）
         self.auto_save_config()
+        self.schedule_live_update()
         
     def update_variation_label(self, value):
         """更新变化范围标签"""
@@ -434,6 +514,7 @@ class iOSRealRunGUI:
         self.variation_value_label.configure(text=f"{variation}%")
         # 自动保存配置（延迟保存，避免频繁写入）
         self.auto_save_config()
+        self.schedule_live_update()
         
     def toggle_speed_settings(self):
         """切换速度设置区域的显示/隐藏"""
@@ -483,13 +564,17 @@ class iOSRealRunGUI:
             self.control_card.configure(border_color=border_color)
         if hasattr(self, 'log_card'):
             self.log_card.configure(border_color=border_color)
+        if hasattr(self, 'map_card'):
+            self.map_card.configure(border_color=border_color)
+            self.map_canvas.set_colors(self.theme_colors["card_bg"])
         
     def browse_route_file(self):
         """浏览路径文件"""
         filetypes = [
-            ("所有支持的文件", "*.txt;*.json"),
+            ("所有支持的文件", "*.txt;*.json;*.gpx;*.kml;*.geojson"),
             ("文本文件", "*.txt"),
             ("JSON文件", "*.json"),
+            ("轨迹文件", "*.gpx;*.kml;*.geojson"),
             ("所有文件", "*.*")
         ]
         try:
@@ -501,20 +586,39 @@ class iOSRealRunGUI:
             if filename:
                 self.route_file_var.set(filename)
                 self.log_message(f"已选择路径文件: {Path(filename).name}")
+                self.preview_route(filename)
+                # 运行中直接切换到新路径
+                if self.is_running:
+                    self.engine.update(route_file=filename)
                 # 自动保存配置
                 self.auto_save_config()
         except Exception as e:
             self.log_message(f"选择文件时出错: {e}")
             messagebox.showerror("错误", f"选择文件时出错: {e}")
             
+    def preview_route(self, route_file):
+        """在后台线程读取路径文件，读完后交给 Tk 线程显示到地图上"""
+        self.map_route_file = route_file
+        
+        def load():
+            try:
+                coordinates = self.route_manager.load_route_coordinates(route_file)
+            except Exception as e:
+                self.log_message(f"路径预览失败: {e}")
+                return
+            self.ui_calls.put(lambda: self._show_route(route_file, coordinates))
+        
+        threading.Thread(target=load, daemon=True).start()
+        
+    def _show_route(self, route_file, coordinates):
+        # 读取期间又选择了其他路径时丢弃旧结果
+        if route_file == self.map_route_file:
+            self.map_canvas.set_route(coordinates)
+            
     def open_route_manager(self):
         """打开路径管理器"""
         self.route_manager_gui.show_route_manager()
         
-    def _get_current_time(self):
-        """获取当前时间字符串"""
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
     def load_config(self):
         """加载配置"""
         try:
@@ -529,10 +633,13 @@ class iOSRealRunGUI:
                     except Exception as e:
                         self.log_message(f"加载JSON路径失败: {e}")
                 self.route_file_var.set(route_config)
+                self.loaded_config['routeConfig'] = self.route_file_var.get()
+                self.preview_route(route_config)
             
             # 加载速度配置
             if hasattr(config.config, 'v'):
                 self.speed_var.set(config.config.v)
+                self.loaded_config['v'] = self.speed_var.get()
                 self.update_speed_label(config.config.v)
                 
         except Exception as e:
@@ -540,44 +647,59 @@ class iOSRealRunGUI:
             
     def save_config(self, silent=False):
         """保存配置到config.yaml"""
+        values = {'v': self.speed_var.get(), 'routeConfig': self.route_file_var.get()}
+        values = {k: v for k, v in values.items() if v != self.loaded_config.get(k)}
         try:
-            config_data = {
-                'v': self.speed_var.get(),
-                'routeConfig': self.route_file_var.get(),
-                'libimobiledeviceDir': getattr(config.config, 'libimobiledeviceDir', 'libimobiledevice'),
-                'imageDir': getattr(config.config, 'imageDir', 'DeveloperDiskImage')
-            }
-            
-            import yaml
-            with open("config.yaml", 'w', encoding='utf-8') as f:
-                yaml.dump(config_data, f, default_flow_style=False, allow_unicode=True)
-                
-            if not silent:
-                self.log_message("配置已保存")
-                messagebox.showinfo("成功", "配置已保存到 config.yaml")
-            else:
-                self.log_message("配置已自动保存")
-            
-        except Exception as e:
+            changed = self.config_store.update(**values)
+        except ValueError as e:
             self.log_message(f"保存配置失败: {e}")
             if not silent:
                 messagebox.showerror("错误", f"保存配置失败: {e}")
+            return
+        # 改过一次之后就按界面上的值保存，即使又改回了原值
+        for key in values:
+            self.loaded_config.pop(key, None)
+            
+        if silent:
+            return
+        if not changed:
+            messagebox.showinfo("成功", "配置未修改，无需保存")
+            return
+        
+        # 在后台线程中等待写入完成，再回到 Tk 线程提示结果
+        def wait_saved():
+            saved = self.config_store.flush()
+            self.ui_calls.put(lambda: self._on_config_saved(saved))
+        
+        threading.Thread(target=wait_saved, daemon=True).start()
+        
+    def _on_config_saved(self, saved):
+        if saved:
+            messagebox.showinfo("成功", "配置已保存到 config.yaml")
+        else:
+            messagebox.showerror("错误", f"保存配置失败: {self.config_store.error}")
                 
     def auto_save_config(self):
-        """自动保存配置（延迟保存，避免频繁写入）"""
-        # 取消之前的定时器
-        if self.auto_save_timer:
-            self.root.after_cancel(self.auto_save_timer)
-        
-        # 设置新的定时器，1秒后保存
-        self.auto_save_timer = self.root.after(1000, lambda: self.save_config(silent=True))
+        """自动保存配置（由配置保存器推迟写入，避免频繁写入）"""
+        self.save_config(silent=True)
             
+    def schedule_live_update(self):
+        """运行中调整速度时延迟发送给引擎，拖动滑块期间不会反复重新规划"""
+        if not self.is_running:
+            return
+        if self.live_update_timer:
+            self.root.after_cancel(self.live_update_timer)
+        self.live_update_timer = self.root.after(300, self.send_live_update)
+        
+    def send_live_update(self):
+        """把当前速度设置发送给正在运行的引擎"""
+        self.live_update_timer = None
+        if self.is_running:
+            self.engine.update(speed=self.speed_var.get(), variation=self.speed_variation_var.get())
+        
     def log_message(self, message):
-        """添加日志消息"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
-        self.log_text.see("end")
-        self.root.update_idletasks()
+        """添加日志消息（可在任意线程调用）"""
+        self.log_sink.write(message)
         
     def update_status(self, status, color="gray"):
         """更新状态显示"""
@@ -600,193 +722,76 @@ class iOSRealRunGUI:
             
         # 更新UI状态
         self.is_running = True
+        self.map_canvas.clear_trail()
         self.start_button.configure(state="disabled")
         self.stop_button.configure(state="normal")
         self.update_status("正在启动...", "orange")
         
-        # 在新线程中运行
-        self.running_thread = threading.Thread(target=self.run_simulation, daemon=True)
-        self.running_thread.start()
+        # 由引擎进程执行初始化、隧道和模拟
+        profile = getattr(config.config, 'paceProfile', None)
+        if profile:
+            self.log_message("按 config.yaml 中的配速方案（paceProfile）跑步")
+        self.engine.start(
+            self.route_file_var.get(),
+            self.speed_var.get(),
+            self.speed_variation_var.get(),
+            profile
+        )
+        self.log_message("会无限循环，点击停止按钮退出")
+        self.log_message("请勿直接关闭窗口，否则无法还原正常定位")
         
     def stop_running(self):
         """停止跑步模拟"""
         if not self.is_running:
             return
             
-        self.is_running = False
         self.update_status("正在停止...", "orange")
-        
-        # 终止隧道进程
-        if self.tunnel_process and self.tunnel_process.is_alive():
-            self.tunnel_process.terminate()
-            self.log_message("隧道进程已终止")
-            
-        # 更新UI状态
-        self.start_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
-        self.update_status("已停止", "red")
-        self.log_message("跑步模拟已停止")
-        
-    def run_simulation(self):
-        """运行模拟的主函数"""
-        try:
-            self.log_message("开始初始化...")
-            
-            # 初始化
-            init.init()
-            self.log_message("初始化完成")
-            
-            # 启动隧道
-            self.log_message("正在启动隧道...")
-            # 在GUI模式下，我们不需要信号处理，因为有停止按钮
-            self.tunnel_process, self.tunnel_address, self.tunnel_port = tunnel.tunnel()
-            
-            self.log_message(f"隧道地址: {self.tunnel_address}, 端口: {self.tunnel_port}")
-            
-            # 获取路径
-            route_file = self.route_file_var.get()
-            
-            # 根据文件格式加载路径
-            if route_file.endswith('.json'):
-                try:
-                    route_data = self.route_manager.load_route_json(route_file)
-                    loc = route_data['coordinates']
-                    self.log_message(f"从JSON文件 {route_file} 获取路径: {route_data['name']}")
-                    if route_data['metadata'].get('distance'):
-                        self.log_message(f"路径距离: {route_data['metadata']['distance']:.1f}米")
-                except Exception as e:
-                    self.log_message(f"加载JSON路径失败: {e}")
-                    raise
-            else:
-                # 传统txt格式 - 自动转换为JSON
-                self.log_message(f"检测到TXT格式路径文件，正在自动转换...")
-                try:
-                    # 读取TXT文件内容
-                    with open(route_file, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                    
-                    # 解析坐标
-                    from util.route import parse_route
-                    coordinates = parse_route(content)
-                    
-                    # 生成JSON文件名
-                    txt_path = Path(route_file)
-                    json_name = f"{txt_path.stem}_converted"
-                    json_path = self.route_manager.routes_dir / f"{json_name}.json"
-                    
-                    # 计算距离
-                    distance = self.route_manager.calculate_route_distance(coordinates)
-                    
-                    # 创建元数据
-                    metadata = {
-                        "description": f"从 {txt_path.name} 自动转换",
-                        "distance": distance,
-                        "created": self._get_current_time(),
-                        "source": str(route_file),
-                        "format": "json"
-                    }
-                    
-                    # 保存为JSON
-                    route_data = {
-                        "name": json_name,
-                        "coordinates": coordinates,
-                        "metadata": metadata
-                    }
-                    
-                    with open(json_path, 'w', encoding='utf-8') as f:
-                        json.dump(route_data, f, indent=2, ensure_ascii=False)
-                    
-                    self.log_message(f"已自动转换为JSON格式: {json_path.name}")
-                    self.log_message(f"路径距离: {distance:.1f}米")
-                    
-                    # 使用转换后的JSON文件
-                    loc = coordinates
-                    
-                except Exception as e:
-                    self.log_message(f"自动转换失败，使用原始TXT格式: {e}")
-                    # 回退到原始方式
-                    original_route_config = config.config.routeConfig
-                    config.config.routeConfig = route_file
-                    
-                    loc = route.get_route()
-                    self.log_message(f"从TXT文件 {route_file} 获取路径")
-                    
-                    # 恢复原始配置
-                    config.config.routeConfig = original_route_config
-            
-            # 更新状态
+        self.engine.stop()
+        
+    def poll_engine(self):
+        """定时取回引擎事件和后台线程的回调并更新界面"""
+        while True:
+            try:
+                call = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                call()
+            except Exception as e:
+                self.log_message(f"界面更新出错: {e}")
+        position = None
+        for kind, data in self.engine.poll():
+            if kind == "log":
+                self.log_message(data["message"])
+            elif kind == "status":
+                self.on_engine_status(data)
+            elif kind == "position":
+                position = data
+        # 一次轮询只绘制最新位置
+        if position is not None:
+            self.map_canvas.set_position(position["lat"], position["lng"])
+        self.root.after(ENGINE_POLL_INTERVAL, self.poll_engine)
+        
+    def on_engine_status(self, status):
+        """根据引擎状态更新按钮和状态指示"""
+        state = status["state"]
+        if state == "starting":
+            self.update_status("正在启动...", "orange")
+        elif state == "running":
             self.update_status("正在跑步...", "green")
-            self.log_message(f"已开始模拟跑步，速度大约为 {self.speed_var.get()} m/s")
-            self.log_message("会无限循环，点击停止按钮退出")
-            self.log_message("请勿直接关闭窗口，否则无法还原正常定位")
-            
-            # 运行模拟
-            speed_variation = self.speed_variation_var.get()
-            asyncio.run(self.run_async(loc, self.speed_var.get(), speed_variation))
-            
-        except Exception as e:
-            self.log_message(f"运行出错: {e}")
-            self.update_status("运行出错", "red")
-        finally:
-            # 清理
-            if self.tunnel_process and self.tunnel_process.is_alive():
-                self.tunnel_process.terminate()
-                self.log_message("隧道进程已终止")
-                
+            # 运行中切换了路径
+            if status.get("route") and status["route"] != self.map_route_file:
+                self.preview_route(status["route"])
+        elif state == "stopping":
+            self.update_status("正在停止...", "orange")
+        else:
             self.is_running = False
             self.start_button.configure(state="normal")
             self.stop_button.configure(state="disabled")
-            self.update_status("已停止", "red")
-            
-    async def run_async(self, loc, speed, speed_variation):
-        """异步运行模拟"""
-        import random
-        import time
-        
-        from pymobiledevice3.remote.remote_service_discovery import RemoteServiceDiscoveryService
-        from pymobiledevice3.services.dvt.instruments.location_simulation import LocationSimulation
-        from pymobiledevice3.services.dvt.dvt_secure_socket_proxy import DvtSecureSocketProxyService
-        
-        rsd = RemoteServiceDiscoveryService((self.tunnel_address, self.tunnel_port))
-        await asyncio.sleep(2)
-        await rsd.connect()
-        dvt = DvtSecureSocketProxyService(rsd)
-        dvt.perform_handshake()
-        
-        while self.is_running:
-            # 计算随机速度
-            v_rand = 1000 / (1000 / speed - (2 * random.random() - 1) * speed_variation)
-            
-            # 运行一圈
-            await self.run_one_round(dvt, loc, v_rand)
-            
-            if self.is_running:
-                self.log_message("跑完一圈了")
-                
-    async def run_one_round(self, dvt, loc, v):
-        """运行一圈"""
-        import math
-        import time
-        import random
-        
-        # 导入必要的模块
-        from pymobiledevice3.services.dvt.instruments.location_simulation import LocationSimulation
-        from run import bd09Towgs84, geodistance, smooth, randLoc, fixLockT
-        
-        dt = 0.2
-        fixed_loc = fixLockT(loc, v, dt)
-        n_list = (5, 6, 7, 8, 9)
-        n = n_list[random.randint(0, len(n_list) - 1)]
-        fixed_loc = randLoc(fixed_loc, n=n)
-        
-        clock = time.time()
-        for i in fixed_loc:
-            if not self.is_running:
-                break
-            LocationSimulation(dvt).set(*bd09Towgs84(i).values())
-            while time.time() - clock < dt and self.is_running:
-                await asyncio.sleep(0.01)
-            clock = time.time()
+            if state == "error":
+                self.update_status("运行出错", "red")
+            else:
+                self.update_status("已停止", "red")
 
 
 def main():
@@ -800,9 +805,12 @@ def main():
     def on_closing():
         if app.is_running:
             if messagebox.askokcancel("退出", "跑步模拟正在运行，确定要退出吗？"):
-                app.stop_running()
+                app.engine.shutdown()
+                app.config_store.close()
                 root.destroy()
         else:
+            app.engine.shutdown()
+            app.config_store.close()
             root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
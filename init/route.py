@@ -5,4 +5,13 @@ from util import route
 def get_route():
     with open(config.config.routeConfig) as myFile:
         loc = route.parse_route(myFile.read())
-    return loc  
+    return loc
+
+def get_track(file_path):
+    """读取带时间戳的轨迹文件（GPX/KML），用于按原始时间回放"""
+    from util.geoformats import load_track
+    track = load_track(file_path, keep_time=True)
+    if not any("time" in p for p in track):
+        raise ValueError(f"{file_path} 中没有时间戳，无法回放")
+    return track
+
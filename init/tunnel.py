@@ -1,57 +1,184 @@
 import re
 import sys
+import time
+import queue
+import signal
+import asyncio
 import logging
-import subprocess
 import multiprocessing
+from collections import deque
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def start_tunnel(queue):
-    command = [sys.executable, '-m', 'pymobiledevice3', 'lockdown', 'start-tunnel']
+TUNNEL_COMMAND = [sys.executable, '-m', 'pymobiledevice3', 'lockdown', 'start-tunnel']
+RSD_PATTERN = re.compile(r"--rsd (\S+) (\d+)")
+# 出现即可判定隧道无法建立的输出，不必等到超时。只匹配 pymobiledevice3 的 ERROR 日志行
+# 和异常的最后一行（以异常类名开头），其他日志中出现这些词不算
+FATAL_PATTERN = re.compile(
+    r"\b(?:ERROR|CRITICAL)\b.*(?:Device is not connected|requires (?:root|admin) privileges|"
+    r"Device is not paired|password protected)"
+    r"|^(?:pymobiledevice3\.exceptions\.)?(?:NoDeviceConnectedError|NotPairedError|PairingError|"
+    r"PasswordRequiredError|AccessDeniedError)\b"
+)
 
-    process = subprocess.Popen(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True
-    )
+# 最近一次 tunnel() 失败的原因
+last_error = None
 
-    logging.info("Tunnel started")
 
-    rsd_pattern = re.compile(r"--rsd (\S+) (\d+)")
-    address, port = None, None
+async def supervise(result, command):
+    """
+    启动隧道子进程并持续读取其输出
 
-    while True:
-        output = process.stdout.readline().strip()
-        if output:
-            logging.info(output)
+    获得 RSD 地址后向 result 放入 ("ready", address, port)；子进程在此之前退出或输出
+    已知的错误时立即放入 ("error", 原因)。建立后继续读取输出直到子进程退出，
+    退出即说明隧道已断开。
+
+    Returns:
+        子进程的退出码
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    logging.info("Tunnel started")
+    if sys.platform != "win32":
+        # 父进程 terminate 时一并结束隧道子进程，不留下孤儿进程；Windows 上见 stop
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, _terminate, process)
 
-        match = rsd_pattern.search(output)
+    tail = deque(maxlen=5)
+    state = "starting"
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            break
+        output = line.decode(errors="replace").strip()
+        if not output:
+            continue
+        logging.info(output)
+        tail.append(output)
+        if state != "starting":
+            continue
+        match = RSD_PATTERN.search(output)
         if match:
             address, port = match.group(1), int(match.group(2))
-            queue.put((address, port))
+            result.put(("ready", address, port))
             logging.info(f"RSD Address: {address}, RSD Port: {port}")
-            break
+            state = "ready"
+        elif FATAL_PATTERN.search(output):
+            result.put(("error", output))
+            state = "failed"
+            _terminate(process)
+
+    code = await process.wait()
+    if state == "starting":
+        result.put(("error", f"隧道进程已退出（退出码 {code}）: {' | '.join(tail) or '没有输出'}"))
+    elif state == "ready":
+        logging.error(f"隧道进程已退出（退出码 {code}），隧道已断开")
+    return code
+
+
+def _terminate(process):
+    try:
+        process.terminate()
+    except ProcessLookupError:
+        pass
+
 
-    process.wait()
+def stop(process, timeout=2):
+    """
+    结束 tunnel() 返回的隧道进程及其启动的 pymobiledevice3 子进程
 
-def tunnel():
-    queue = multiprocessing.Queue()
-    process = multiprocessing.Process(target=start_tunnel, args=(queue,))
+    POSIX 上 terminate 发送的 SIGTERM 会由 supervise 转给子进程；Windows 上 terminate
+    直接结束进程、不会通知子进程，因此用 taskkill /T 结束整个进程树。
+    """
+    if process.is_alive():
+        if sys.platform == "win32":
+            import subprocess
+            subprocess.run(["taskkill", "/PID", str(process.pid), "/T", "/F"],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            process.terminate()
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()
+        process.join(timeout)
+
+
+def start_tunnel(result, command=None):
+    """隧道进程入口，隧道子进程异常退出时以非零退出码结束"""
+    code = asyncio.run(supervise(result, command or TUNNEL_COMMAND))
+    sys.exit(1 if code else 0)
+
+
+def tunnel(timeout=20, command=None):
+    """
+    在独立进程中建立隧道
+
+    每 0.1 秒检查一次结果和隧道进程的状态，子进程报错或退出时立即返回，
+    只有一直没有输出 RSD 地址时才等满 timeout 秒。
+
+    Returns:
+        (隧道进程, RSD 地址, 端口)；失败时为 (None, None, None)，原因见 last_error
+    """
+    global last_error
+    result = multiprocessing.Queue()
+    process = multiprocessing.Process(target=start_tunnel, args=(result, command))
     process.start()
-    
+
+    deadline = time.monotonic() + timeout
     try:
-        result = queue.get(timeout=20)
-        if result is None:
-            raise RuntimeError("❌ 无法建立隧道连接")
-        address, port = result
-        
-        return process, address, port
+        while True:
+            try:
+                message = result.get(timeout=0.1)
+            except queue.Empty:
+                if not process.is_alive():
+                    try:
+                        message = result.get_nowait()
+                    except queue.Empty:
+                        raise RuntimeError(f"隧道进程意外退出（退出码 {process.exitcode}）")
+                elif time.monotonic() > deadline:
+                    raise RuntimeError(f"{timeout} 秒内没有获得 RSD 地址")
+                else:
+                    continue
+            if message[0] == "ready":
+                last_error = None
+                return process, message[1], message[2]
+            raise RuntimeError(message[1])
     except Exception as e:
+        last_error = str(e)
         logging.error(f"❌ 隧道建立失败: {e}")
-        process.terminate()
-        process.join(timeout=2)
-        if process.is_alive():
-            process.kill()
+        stop(process)
 
     return None, None, None
+
+
+async def wait_ready(address, port, timeout=10.0, delay=0.05, max_delay=0.5):
+    """
+    等待隧道另一端的 RSD 端口可以连接
+
+    按指数退避（delay 起，每次翻倍，最多 max_delay）反复尝试建立 TCP 连接，
+    成功后立即返回，代替固定等待。
+
+    Returns:
+        等待的秒数
+
+    Raises:
+        TimeoutError: timeout 秒内一直无法连接
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), max(0.05, min(1.0, deadline - time.perf_counter()))
+            )
+            writer.close()
+            return time.perf_counter() - start
+        except (OSError, asyncio.TimeoutError) as e:
+            error = e
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TimeoutError(f"{timeout:.0f} 秒内无法连接 {address}:{port}（尝试 {attempts} 次）: {error}")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
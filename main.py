@@ -1,61 +1,151 @@
 import signal
 import logging
-import coloredlogs
 import os
 import asyncio
 
-
-from init import init
-from init import tunnel
-from init import route
-
-import run
 import config
 
 
 
 debug = os.environ.get("DEBUG", False)
 
-coloredlogs.install(level=logging.INFO)
-logging.getLogger('wintun').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('quic').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('asyncio').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('zeroconf').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('parso.cache').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('parso.cache.pickle').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('parso.python.diff').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('humanfriendly.prompts').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('blib2to3.pgen2.driver').setLevel(logging.DEBUG if debug else logging.WARNING)
-logging.getLogger('urllib3.connectionpool').setLevel(logging.DEBUG if debug else logging.WARNING)
-
 
-
-async def main():
+QUIET_LOGGERS = (
+    'wintun',
+    'quic',
+    'asyncio',
+    'zeroconf',
+    'parso.cache',
+    'parso.cache.pickle',
+    'parso.python.diff',
+    'humanfriendly.prompts',
+    'blib2to3.pgen2.driver',
+    'urllib3.connectionpool',
+)
+
+
+def setup_logging():
+    """
+    配置日志；在 main 中调用，导入本模块时不安装 coloredlogs
+
+    终端输出和事件日志（配置项 eventLog）都经队列交给后台线程，发送循环中的
+    DEBUG 日志不会阻塞在终端或文件 IO 上。
+
+    退出时（包括 init 检查失败调用 sys.exit）由 atexit 写完剩余的记录。
+    """
+    import atexit
+    import coloredlogs
+    from engine import EVENT_LOG
+    from util import eventlog
+
+    level = logging.DEBUG if debug else logging.INFO
+    coloredlogs.install(level=level)
+    handlers = logging.getLogger().handlers[:]
+    try:
+        path = getattr(config.config, "eventLog", EVENT_LOG)
+    except Exception:
+        # 配置有问题时 init 会报告，这里先按默认值记录
+        path = EVENT_LOG
+    try:
+        handlers.append(eventlog.file_handler(path))
+    except OSError as e:
+        print(f"无法创建事件日志 {path}: {e}")
+    listener = eventlog.start(handlers, level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.DEBUG if debug else logging.WARNING)
+    atexit.register(listener.stop)
+
+
+def load_pace():
+    """
+    读取配置项 paceProfile
+
+    Returns:
+        util.pace.PaceProfile；没有设置时返回 None
+    """
+    profile = getattr(config.config, "paceProfile", None)
+    if not profile:
+        return None
+    from util.pace import PaceProfile
+    return PaceProfile.load(profile, config.config.v)
+
+
+def simulate(output, duration=1800):
+    """不连接设备，用虚拟时钟按配置跑 duration 秒，把发送的位置写入 output"""
+    import time
+    from init import route
+    import run
+
+    loc = route.get_route()
+    pace = load_pace()
+    start = time.perf_counter()
+    laps, ticks = run.simulate(loc, config.config.v, output, duration, pace=pace)
+    print(f"模拟完成：{duration / 60:.1f} 分钟，{laps} 圈，{ticks} 个点，"
+          f"用时 {time.perf_counter() - start:.2f} 秒，已写入 {output}")
+
+
+async def main(replay_file=None, time_scale=1.0, replay_loop=False):
+    # pymobiledevice3 和 geopy 加载较慢，只在真正运行时导入
+    from init import init
+    from init import tunnel
+    from init import route
+    from util.journal import open_session
+    from util.phases import PhaseTimer
+    import run
+
+    setup_logging()
     logger = logging.getLogger(__name__)
-    coloredlogs.install(level=logging.INFO)
     logger.setLevel(logging.INFO)
     if debug:
         logger.setLevel(logging.DEBUG)
-        coloredlogs.install(level=logging.DEBUG)
 
-    init.init()
+    timer = PhaseTimer(logger.info)
+    with timer.phase("初始化"):
+        init.init()
     logger.info("init done")
 
     logger.info("trying to start tunnel")
     original_sigint_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-    process, address, port = tunnel.tunnel()
+    # 隧道在单独的进程中建立，这里只是等待，不做性能分析
+    with timer.phase("启动隧道", profile=False):
+        process, address, port = tunnel.tunnel()
     signal.signal(signal.SIGINT, original_sigint_handler)
+    if process is None:
+        logger.error(f"tunnel failed: {tunnel.last_error}")
+        return
     try:
         logger.debug(f"tunnel address: {address}, port: {port}")
 
-        loc = route.get_route()
-        logger.info(f"got route from {config.config.routeConfig}")
+        with timer.phase("读取路径"):
+            if replay_file:
+                track = route.get_track(replay_file)
+                logger.info(f"got track from {replay_file}")
+            else:
+                loc = route.get_route()
+                logger.info(f"got route from {config.config.routeConfig}")
+                pace = load_pace()
 
         try:
-            print(f"已开始模拟跑步，速度大约为 {config.config.v} m/s")
-            print("会无限循环，按 Ctrl+C 退出")
-            print("请勿直接关闭窗口，否则无法还原正常定位")
-            await run.run(address, port, loc, config.config.v)
+            if replay_file:
+                print(f"已开始按原始时间回放轨迹，共 {len(track)} 个点，倍速 {time_scale}")
+                print("按 Ctrl+C 退出")
+                print("请勿直接关闭窗口，否则无法还原正常定位")
+                await run.replay(address, port, track, scale=time_scale, loop=replay_loop, timer=timer)
+            else:
+                if pace is not None:
+                    print(f"已开始按配速方案模拟跑步，共 {len(pace.phases)} 个阶段，"
+                          f"{pace.duration / 60:.1f} 分钟后按 {pace.final_speed:.2f} m/s 继续")
+                else:
+                    print(f"已开始模拟跑步，速度大约为 {config.config.v} m/s")
+                print("会无限循环，按 Ctrl+C 退出")
+                print("请勿直接关闭窗口，否则无法还原正常定位")
+                journal = open_session(getattr(config.config, "journalDir", "journals"), 0.2)
+                try:
+                    await run.run(address, port, loc, config.config.v, journal=journal, timer=timer, pace=pace)
+                finally:
+                    if journal is not None:
+                        journal.close()
+                        print(f"发送记录已保存到 {journal.path}")
         except KeyboardInterrupt:
             logger.debug("get KeyboardInterrupt (inner)")
             logger.debug(f"Is process alive? {process.is_alive()}")
@@ -68,7 +158,7 @@ async def main():
     finally:
         logger.debug(f"Is process alive? {process.is_alive()}")
         logger.debug("terminating tunnel process")
-        process.terminate()
+        tunnel.stop(process)
         logger.info("tunnel process terminated")
         print("Bye")
     
@@ -0,0 +1,185 @@
+"""
+map_view.py
+离线路径预览画布
+
+不依赖瓦片服务器，直接在 Tk Canvas 上按等距投影绘制路径和实时位置。
+路径按当前缩放比例抽稀（相邻点在屏幕上不足 1 像素的只保留一个），
+十万个点的路径也只需要绘制几千段；实时位置按固定帧率刷新，
+引擎发送再快也不会让界面忙于重绘。
+"""
+import math
+import tkinter as tk
+
+from util.geometry import project
+
+
+def decimate(points, min_px=1.0):
+    """
+    屏幕坐标抽稀：丢弃与上一个保留点距离小于 min_px 像素的点
+
+    Args:
+        points: [(x, y), ...] 屏幕坐标
+        min_px: 最小像素间距
+
+    Returns:
+        扁平的坐标列表 [x0, y0, x1, y1, ...]，可直接传给 create_line
+    """
+    if not points:
+        return []
+    min2 = min_px * min_px
+    lx, ly = points[0]
+    flat = [lx, ly]
+    for x, y in points:
+        dx = x - lx
+        dy = y - ly
+        if dx * dx + dy * dy >= min2:
+            flat.append(x)
+            flat.append(y)
+            lx, ly = x, y
+    x, y = points[-1]
+    if (flat[-2], flat[-1]) != (x, y):
+        flat.append(x)
+        flat.append(y)
+    return flat
+
+
+class MapCanvas(tk.Canvas):
+    """路径和实时位置预览"""
+
+    def __init__(self, parent, fps=10, trail_length=2000, padding=12, **kwargs):
+        kwargs.setdefault("highlightthickness", 0)
+        kwargs.setdefault("background", "#1a1a1a")
+        super().__init__(parent, **kwargs)
+        self.frame_interval = int(1000 / fps)
+        self.trail_length = trail_length
+        self.padding = padding
+        self.route_color = "#1f6aa5"
+        self.trail_color = "#2fa572"
+        self.marker_color = "#d32f2f"
+
+        self.origin = None
+        self.route_xy = []
+        self.extent = None
+        self.transform = None
+        self.trail_xy = []
+        self.pending_position = None
+        self.marker = None
+        self.timer = None
+
+        self.bind("<Configure>", lambda e: self.redraw())
+
+    def set_colors(self, background, route=None, trail=None, marker=None):
+        """切换主题时更新配色"""
+        self.configure(background=background)
+        self.route_color = route or self.route_color
+        self.trail_color = trail or self.trail_color
+        self.marker_color = marker or self.marker_color
+        self.redraw()
+
+    def set_route(self, coordinates, closed=True):
+        """
+        显示路径
+
+        Args:
+            coordinates: 坐标列表
+            closed: 是否把终点连回起点
+        """
+        self.trail_xy = []
+        if not coordinates:
+            self.origin = None
+            self.route_xy = []
+            self.extent = None
+            self.redraw()
+            return
+        self.origin = coordinates[0]
+        self.route_xy = project(coordinates, origin=self.origin)
+        if closed and len(self.route_xy) > 2:
+            self.route_xy.append(self.route_xy[0])
+        xs = [p[0] for p in self.route_xy]
+        ys = [p[1] for p in self.route_xy]
+        self.extent = (min(xs), min(ys), max(xs), max(ys))
+        self.redraw()
+
+    def _fit(self):
+        """计算投影坐标（米）到屏幕像素的变换"""
+        width = max(self.winfo_width(), 1)
+        height = max(self.winfo_height(), 1)
+        x0, y0, x1, y1 = self.extent
+        span = max(x1 - x0, y1 - y0, 1.0)
+        scale = min(width, height) - 2 * self.padding
+        scale = max(scale, 1) / span
+        cx = (x0 + x1) / 2
+        cy = (y0 + y1) / 2
+        # 屏幕 y 轴向下，北方朝上
+        self.transform = (scale, width / 2 - cx * scale, height / 2 + cy * scale)
+
+    def _to_screen(self, points):
+        scale, ox, oy = self.transform
+        return [(ox + x * scale, oy - y * scale) for x, y in points]
+
+    def redraw(self):
+        """按当前尺寸重新绘制路径、轨迹和标记"""
+        self.delete("all")
+        self.marker = None
+        if self.extent is None:
+            return
+        self._fit()
+        flat = decimate(self._to_screen(self.route_xy))
+        if len(flat) >= 4:
+            self.create_line(*flat, fill=self.route_color, width=2, tags="route")
+        trail = decimate(self._to_screen(self.trail_xy))
+        if len(trail) >= 4:
+            self.create_line(*trail, fill=self.trail_color, width=2, tags="trail")
+        sx, sy = self._to_screen(self.route_xy[:1])[0]
+        self.create_oval(sx - 4, sy - 4, sx + 4, sy + 4, outline=self.route_color, width=2, tags="start")
+        if self.trail_xy:
+            self._draw_marker(*self._to_screen(self.trail_xy[-1:])[0])
+
+    def _draw_marker(self, x, y):
+        r = 5
+        if self.marker is None:
+            self.marker = self.create_oval(x - r, y - r, x + r, y + r,
+                                           fill=self.marker_color, outline="", tags="marker")
+        else:
+            self.coords(self.marker, x - r, y - r, x + r, y + r)
+        self.tag_raise("marker")
+
+    def set_position(self, lat, lng):
+        """
+        更新实时位置，可以高频调用
+
+        只记录最新位置，真正的绘制由定时器按 fps 限速执行。
+        """
+        self.pending_position = (lat, lng)
+        if self.timer is None:
+            self.timer = self.after(self.frame_interval, self._flush_position)
+
+    def _flush_position(self):
+        self.timer = None
+        if self.pending_position is None or self.origin is None:
+            return
+        lat, lng = self.pending_position
+        self.pending_position = None
+        x, y = project([{"lat": lat, "lng": lng}], origin=self.origin)[0]
+
+        self.trail_xy.append((x, y))
+        if len(self.trail_xy) > self.trail_length:
+            # 一次丢弃一半并整体重绘，合并累积的线段对象
+            del self.trail_xy[:len(self.trail_xy) - self.trail_length // 2]
+            self.redraw()
+            return
+
+        if self.transform is None:
+            return
+        sx, sy = self._to_screen([(x, y)])[0]
+        # 轨迹只追加一段线，不重绘整条路径
+        if len(self.trail_xy) >= 2:
+            px, py = self._to_screen(self.trail_xy[-2:-1])[0]
+            if math.hypot(sx - px, sy - py) >= 1:
+                self.create_line(px, py, sx, sy, fill=self.trail_color, width=2, tags="trail")
+        self._draw_marker(sx, sy)
+
+    def clear_trail(self):
+        self.trail_xy = []
+        self.pending_position = None
+        self.redraw()
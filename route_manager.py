@@ -1,19 +1,37 @@
 import json
 import os
+import queue
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import customtkinter as ctk
 
+# 导出格式 (扩展名, 显示名称)
+EXPORT_FORMATS = (
+    ("json", "JSON格式"),
+    ("txt", "TXT格式"),
+    ("gpx", "GPX轨迹"),
+    ("kml", "KML轨迹"),
+    ("geojson", "GeoJSON"),
+)
+
 
 class RouteManager:
     """路径管理器，支持多种格式的路径文件"""
     
+    # 可以导入的文件扩展名
+    IMPORT_EXTENSIONS = (".txt", ".json", ".gpx", ".kml", ".geojson")
+    
     def __init__(self, routes_dir: str = "routes"):
         self.routes_dir = Path(routes_dir)
         self.routes_dir.mkdir(exist_ok=True)
         
+        # 空间索引：file_path -> {"mtime", "name", "bbox", "points"}
+        self._geometry = {}
+        self._spatial_index = None
+        
     def save_route_json(self, route_name: str, coordinates: List[Dict], 
                        metadata: Optional[Dict] = None) -> str:
         """
@@ -40,13 +58,14 @@ class RouteManager:
                 "format": "json"
             }
         }
+        if "simplify" in metadata:
+            route_data["metadata"]["simplify"] = metadata["simplify"]
         
         # 确保路径名称安全（处理中文字符）
         safe_name = self._make_safe_filename(route_name)
         file_path = self.routes_dir / f"{safe_name}.json"
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(route_data, f, indent=2, ensure_ascii=False)
+        self._atomic_write_json(file_path, route_data)
             
         return str(file_path)
         
@@ -63,8 +82,30 @@ class RouteManager:
         with open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
             
+    def load_route_coordinates(self, file_path: str) -> List[Dict]:
+        """
+        读取路径文件中的坐标（JSON或txt格式）
+        
+        Args:
+            file_path: 路径文件路径
+            
+        Returns:
+            坐标列表
+        """
+        if str(file_path).endswith('.json'):
+            return self.load_route_json(file_path)["coordinates"]
+        suffix = Path(file_path).suffix.lower()
+        if suffix in (".gpx", ".kml", ".geojson"):
+            from util.geoformats import load_track
+            return load_track(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        from util.route import parse_route
+        return parse_route(content)
+        
     def convert_txt_to_json(self, txt_file_path: str, route_name: str, 
-                           description: str = "") -> str:
+                           description: str = "",
+                           simplify_tolerance: Optional[float] = None) -> str:
         """
         将现有的txt格式路径文件转换为JSON格式
         
@@ -72,6 +113,7 @@ class RouteManager:
             txt_file_path: 原始txt文件路径
             route_name: 新路径名称
             description: 路径描述
+            simplify_tolerance: 导入时简化路径的容差（米），None 表示不简化
             
         Returns:
             新JSON文件路径
@@ -84,6 +126,44 @@ class RouteManager:
         from util.route import parse_route
         coordinates = parse_route(content)
         
+        return self._save_converted_route(
+            route_name, coordinates, description, txt_file_path, simplify_tolerance
+        )
+        
+    def convert_track_to_json(self, track_file_path: str, route_name: str,
+                              description: str = "",
+                              simplify_tolerance: Optional[float] = None) -> str:
+        """
+        将GPX/KML/GeoJSON轨迹转换为JSON格式路径
+        
+        轨迹中的WGS-84坐标会转换为路径使用的BD-09坐标。
+        
+        Args:
+            track_file_path: 轨迹文件路径
+            route_name: 新路径名称
+            description: 路径描述
+            simplify_tolerance: 简化容差（米），None 表示不简化
+            
+        Returns:
+            新JSON文件路径
+        """
+        from util.geoformats import load_track
+        coordinates = load_track(track_file_path)
+        if not coordinates:
+            raise ValueError("轨迹文件中没有坐标")
+        
+        return self._save_converted_route(
+            route_name, coordinates, description, track_file_path, simplify_tolerance
+        )
+        
+    def _save_converted_route(self, route_name: str, coordinates: List[Dict], description: str,
+                              source: str, simplify_tolerance: Optional[float]) -> str:
+        """简化（可选）、计算距离并保存转换得到的路径"""
+        # 简化路径
+        simplify_report = None
+        if simplify_tolerance:
+            coordinates, simplify_report = self.simplify_route(coordinates, simplify_tolerance)
+        
         # 计算距离
         distance = self.calculate_route_distance(coordinates)
         
@@ -92,11 +172,147 @@ class RouteManager:
             "description": description,
             "distance": distance,
             "created": self._get_current_time(),
-            "source": txt_file_path
+            "source": source
         }
+        if simplify_report:
+            metadata["simplify"] = simplify_report
         
         return self.save_route_json(route_name, coordinates, metadata)
         
+    def import_route_file(self, file_path: str,
+                          simplify_tolerance: Optional[float] = None,
+                          route_name: Optional[str] = None) -> str:
+        """
+        导入单个路径文件到路径目录
+        
+        Args:
+            file_path: 源文件路径（txt、JSON、GPX、KML或GeoJSON）
+            simplify_tolerance: txt/轨迹导入时的简化容差（米）
+            route_name: 保存的文件名（不含扩展名），默认见 import_name
+            
+        Returns:
+            导入后的JSON文件路径
+        """
+        path = Path(file_path)
+        if path.suffix.lower() == '.json':
+            # JSON文件原样复制，但要确认格式正确
+            route_data = self.load_route_json(file_path)
+            if not route_data.get("coordinates"):
+                raise ValueError("JSON文件中没有坐标")
+            route_name = route_name or route_data.get("name") or path.stem
+            new_path = self.routes_dir / f"{self._make_safe_filename(route_name)}.json"
+            self._atomic_write_json(new_path, route_data)
+            return str(new_path)
+        
+        if path.suffix.lower() in (".gpx", ".kml", ".geojson"):
+            return self.convert_track_to_json(
+                file_path, route_name or path.stem, f"从 {path.name} 导入",
+                simplify_tolerance=simplify_tolerance
+            )
+        
+        return self.convert_txt_to_json(
+            file_path, route_name or path.stem, f"从 {path.name} 导入",
+            simplify_tolerance=simplify_tolerance
+        )
+        
+    def import_name(self, file_path: str) -> str:
+        """import_route_file 默认保存的文件名：JSON 文件为其中的路径名称，其他为文件名"""
+        path = Path(file_path)
+        if path.suffix.lower() == '.json':
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    name = json.load(f).get("name")
+                if name:
+                    return self._make_safe_filename(name)
+            except (OSError, ValueError, AttributeError):
+                pass  # 读取失败时导入也会失败，这里只需要一个名字
+        return self._make_safe_filename(path.stem)
+        
+    def collect_route_files(self, source: str) -> List[str]:
+        """
+        收集目录（或单个文件）中所有可导入的路径文件
+        
+        Args:
+            source: 目录或文件路径
+            
+        Returns:
+            文件路径列表
+        """
+        source_path = Path(source)
+        if source_path.is_file():
+            return [str(source_path)]
+        return sorted(
+            str(p) for p in source_path.rglob("*")
+            if p.is_file() and p.suffix.lower() in self.IMPORT_EXTENSIONS
+        )
+        
+    def batch_import(self, file_paths: List[str], workers: Optional[int] = None,
+                     progress=None, simplify_tolerance: Optional[float] = None) -> List[Dict]:
+        """
+        使用进程池并行导入多个路径文件
+        
+        每个文件在独立进程中解析、计算距离并原子写入路径目录，
+        单个文件失败不会影响其他文件。
+        
+        Args:
+            file_paths: 源文件列表
+            workers: 进程数，默认为CPU核数
+            progress: 进度回调 progress(done, total, result)
+            simplify_tolerance: txt导入时的简化容差（米）
+            
+        Returns:
+            [{"source": str, "path": str or None, "error": str or None, "note": str or None}, ...]，
+            顺序与 file_paths 一致；不同目录中的文件保存后重名时，后面的文件加上 _2、_3 等后缀，
+            并在 note 中说明
+        """
+        names, notes = _unique_names([self.import_name(path) for path in file_paths])
+        jobs = [(str(self.routes_dir), path, simplify_tolerance, name, note)
+                for path, name, note in zip(file_paths, names, notes)]
+        return self._run_batch(_batch_import_worker, jobs, workers, progress)
+        
+    def batch_export(self, file_paths: List[str], export_dir: str, format: str = "json",
+                     workers: Optional[int] = None, progress=None) -> List[Dict]:
+        """
+        使用进程池并行转换多个路径文件的格式
+        
+        Args:
+            file_paths: 源文件列表
+            export_dir: 导出目录
+            format: 导出格式
+            workers: 进程数，默认为CPU核数
+            progress: 进度回调 progress(done, total, result)
+            
+        Returns:
+            结果列表，格式同 batch_import（重名的文件同样加后缀）
+        """
+        Path(export_dir).mkdir(parents=True, exist_ok=True)
+        names, notes = _unique_names([Path(path).stem for path in file_paths])
+        jobs = [(str(self.routes_dir), path, export_dir, format, name, note)
+                for path, name, note in zip(file_paths, names, notes)]
+        return self._run_batch(_batch_export_worker, jobs, workers, progress)
+        
+    def _run_batch(self, worker, jobs, workers, progress) -> List[Dict]:
+        """在进程池中执行批量任务，按完成顺序回调进度"""
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        
+        results = [None] * len(jobs)
+        if not jobs:
+            return results
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(worker, *job): i for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # 进程崩溃等无法在worker内部捕获的错误
+                    results[i] = {"source": jobs[i][1], "path": None, "error": str(e), "note": None}
+                done += 1
+                if progress:
+                    progress(done, len(jobs), results[i])
+        return results
+        
     def calculate_route_distance(self, coordinates: List[Dict]) -> float:
         """
         计算路径总距离（米）
@@ -122,6 +338,45 @@ class RouteManager:
             
         return total_distance
         
+    def simplify_route(self, coordinates: List[Dict], tolerance: float = 1.0,
+                       method: str = "dp") -> Tuple[List[Dict], Dict]:
+        """
+        简化路径，删除近似共线的冗余点
+        
+        Args:
+            coordinates: 坐标列表
+            tolerance: 容差（米），简化后路径与原路径的偏差不超过该值
+            method: "dp" (Douglas–Peucker) 或 "vw" (Visvalingam–Whyatt)
+            
+        Returns:
+            (简化后的坐标列表, 报告 {"method", "tolerance", "original_points",
+             "simplified_points", "original_distance", "simplified_distance",
+             "distance_change"})
+        """
+        from util.geometry import SIMPLIFY_METHODS
+        if method not in SIMPLIFY_METHODS:
+            raise ValueError(f"不支持的简化方法: {method}")
+            
+        # 路径首尾相连，先把起点追加到末尾，让闭合段也参与简化
+        closed = len(coordinates) > 2
+        points = coordinates + [coordinates[0]] if closed else coordinates
+        simplified = SIMPLIFY_METHODS[method](points, tolerance)
+        if closed:
+            simplified = simplified[:-1]
+            
+        original_distance = self.calculate_route_distance(coordinates)
+        simplified_distance = self.calculate_route_distance(simplified)
+        report = {
+            "method": method,
+            "tolerance": tolerance,
+            "original_points": len(coordinates),
+            "simplified_points": len(simplified),
+            "original_distance": original_distance,
+            "simplified_distance": simplified_distance,
+            "distance_change": simplified_distance - original_distance
+        }
+        return simplified, report
+        
     def get_route_list(self) -> List[Dict]:
         """
         获取所有可用路径的列表
@@ -194,23 +449,18 @@ class RouteManager:
         Args:
             file_path: 源文件路径
             export_path: 导出路径
-            format: 导出格式 ("json" 或 "txt")
+            format: 导出格式 ("json"、"txt"、"gpx"、"kml" 或 "geojson")
             
         Returns:
             是否导出成功
         """
         try:
-            if file_path.endswith('.json'):
-                route_data = self.load_route_json(file_path)
-                coordinates = route_data["coordinates"]
-            else:
-                # txt格式
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                from util.route import parse_route
-                coordinates = parse_route(content)
+            coordinates = self.load_route_coordinates(file_path)
                 
-            if format == "json":
+            if format in ("gpx", "kml", "geojson"):
+                from util.geoformats import TRACK_WRITERS
+                TRACK_WRITERS[format](export_path, coordinates, Path(file_path).stem)
+            elif format == "json":
                 if not file_path.endswith('.json'):
                     # 需要转换
                     route_name = Path(file_path).stem
@@ -240,11 +490,149 @@ class RouteManager:
             print(f"导出文件失败: {e}")
             return False
             
+    def refresh_spatial_index(self) -> int:
+        """
+        增量更新路径库的空间索引，只重新读取修改过的文件
+        
+        Returns:
+            索引中的路径数量
+        """
+        from util.geometry import simplify_douglas_peucker
+        from util.spatial import GridIndex, bounding_box
+        
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex()
+            
+        current = set()
+        for file in list(self.routes_dir.glob("*.json")) + list(self.routes_dir.glob("*.txt")):
+            file_path = str(file)
+            current.add(file_path)
+            try:
+                mtime = file.stat().st_mtime
+                cached = self._geometry.get(file_path)
+                if cached and cached["mtime"] == mtime:
+                    continue
+                # JSON 文件只解析一次，坐标和名称都从同一份数据中取
+                if file_path.endswith('.json'):
+                    route_data = self.load_route_json(file_path)
+                    coordinates = route_data["coordinates"]
+                    name = route_data.get("name") or file.stem
+                else:
+                    coordinates = self.load_route_coordinates(file_path)
+                    name = file.stem
+                if not coordinates:
+                    continue
+                bbox = bounding_box(coordinates)
+                # 索引只保存 1 米容差简化后的点，加快距离计算
+                self._geometry[file_path] = {
+                    "mtime": mtime,
+                    "name": name,
+                    "bbox": bbox,
+                    "points": simplify_douglas_peucker(coordinates, 1.0)
+                }
+                self._spatial_index.insert(file_path, bbox)
+            except Exception as e:
+                print(f"索引路径文件 {file_path} 失败: {e}")
+                
+        for file_path in set(self._geometry) - current:
+            del self._geometry[file_path]
+            self._spatial_index.remove(file_path)
+            
+        return len(self._spatial_index)
+        
+    def find_routes_near(self, lat: float, lng: float, k: int = 5,
+                         max_distance: float = float("inf")) -> List[Dict]:
+        """
+        查找距离某点最近的路径
+        
+        Args:
+            lat, lng: 查询点
+            k: 返回的最大数量
+            max_distance: 最大距离（米）
+            
+        Returns:
+            [{"name", "file_path", "distance_to_point"}, ...] 按距离升序
+        """
+        from util.spatial import point_to_route_distance
+        self.refresh_spatial_index()
+        
+        def distance(file_path):
+            return point_to_route_distance(lat, lng, self._geometry[file_path]["points"])
+            
+        return [
+            {"name": self._geometry[key]["name"], "file_path": key, "distance_to_point": d}
+            for d, key in self._spatial_index.nearest(lat, lng, k, distance, max_distance)
+        ]
+        
+    def find_routes_in_bbox(self, min_lat: float, min_lng: float,
+                            max_lat: float, max_lng: float) -> List[Dict]:
+        """
+        查找与给定范围相交的路径
+        
+        Returns:
+            [{"name", "file_path", "bbox"}, ...]
+        """
+        self.refresh_spatial_index()
+        keys = self._spatial_index.query_bbox((min_lat, min_lng, max_lat, max_lng))
+        return sorted(
+            ({"name": self._geometry[key]["name"], "file_path": key,
+              "bbox": self._geometry[key]["bbox"]} for key in keys),
+            key=lambda x: x["name"]
+        )
+        
+    def find_duplicate_routes(self, threshold: float = 20.0,
+                              metric: str = "hausdorff") -> List[Dict]:
+        """
+        查找近似重复的路径
+        
+        Args:
+            threshold: 判定为重复的最大距离（米）
+            metric: "hausdorff"（忽略方向）或 "frechet"（考虑方向和顺序）
+            
+        Returns:
+            [{"a", "b", "distance"}, ...]，a/b 为文件路径
+        """
+        from util.spatial import bbox_gap, hausdorff_distance, frechet_distance
+        if metric not in ("hausdorff", "frechet"):
+            raise ValueError(f"不支持的距离度量: {metric}")
+        self.refresh_spatial_index()
+        
+        duplicates = []
+        for key in sorted(self._geometry):
+            entry = self._geometry[key]
+            for other in self._spatial_index.query_bbox(entry["bbox"]):
+                if other <= key:
+                    continue
+                other_entry = self._geometry[other]
+                # 包围盒相差超过阈值时距离必然超过阈值
+                if bbox_gap(entry["bbox"], other_entry["bbox"]) > threshold:
+                    continue
+                if metric == "hausdorff":
+                    d = hausdorff_distance(entry["points"], other_entry["points"], limit=threshold)
+                else:
+                    d = frechet_distance(entry["points"], other_entry["points"])
+                if d <= threshold:
+                    duplicates.append({"a": key, "b": other, "distance": d})
+        return duplicates
+        
     def _get_current_time(self) -> str:
         """获取当前时间字符串"""
         from datetime import datetime
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
+    def _atomic_write_json(self, file_path, data):
+        """先写入临时文件再替换，避免程序中断时留下损坏的路径文件"""
+        file_path = Path(file_path)
+        tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        
     def _make_safe_filename(self, filename: str) -> str:
         """创建安全的文件名，支持中文字符"""
         import re
@@ -256,12 +644,56 @@ class RouteManager:
         return safe_name
 
 
+def _unique_names(names: List[str]) -> Tuple[List[str], List[Optional[str]]]:
+    """
+    给批量任务中重名的输出加上 _2、_3 等后缀（不区分大小写，Windows/macOS 的文件名不区分）
+
+    Returns:
+        (输出名列表, 说明列表)，未改名的说明为 None
+    """
+    taken = {name.lower() for name in names}
+    seen = set()
+    result, notes = [], []
+    for name in names:
+        unique = name
+        k = 1
+        # 加的后缀也不能与其他文件原来的名字相同
+        while unique.lower() in seen or (unique != name and unique.lower() in taken):
+            k += 1
+            unique = f"{name}_{k}"
+        seen.add(unique.lower())
+        result.append(unique)
+        notes.append(None if unique == name else f"与其他文件重名，已保存为 {unique}")
+    return result, notes
+
+
+def _batch_import_worker(routes_dir: str, file_path: str, simplify_tolerance: Optional[float],
+                         route_name: Optional[str] = None, note: Optional[str] = None) -> Dict:
+    """batch_import 的进程池任务"""
+    try:
+        new_path = RouteManager(routes_dir).import_route_file(file_path, simplify_tolerance, route_name)
+        return {"source": file_path, "path": new_path, "error": None, "note": note}
+    except Exception as e:
+        return {"source": file_path, "path": None, "error": str(e), "note": None}
+
+
+def _batch_export_worker(routes_dir: str, file_path: str, export_dir: str, format: str,
+                         name: Optional[str] = None, note: Optional[str] = None) -> Dict:
+    """batch_export 的进程池任务"""
+    export_path = str(Path(export_dir) / f"{name or Path(file_path).stem}.{format}")
+    if RouteManager(routes_dir).export_route(file_path, export_path, format):
+        return {"source": file_path, "path": export_path, "error": None, "note": note}
+    return {"source": file_path, "path": None, "error": "导出失败", "note": None}
+
+
 class RouteManagerGUI:
     """路径管理器GUI界面"""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, simplify_tolerance: Optional[float] = None):
         self.route_manager = RouteManager()
         self.parent = parent
+        # 导入TXT路径时的简化容差（米），None 表示保留全部坐标点
+        self.simplify_tolerance = simplify_tolerance
         
     def show_route_manager(self):
         """显示路径管理器窗口"""
@@ -312,6 +744,14 @@ class RouteManagerGUI:
             height=35
         ).pack(side="left", padx=(0, 10))
         
+        ctk.CTkButton(
+            button_frame,
+            text="📦 批量导入",
+            command=self.batch_import_routes,
+            width=120,
+            height=35
+        ).pack(side="left", padx=(0, 10))
+        
         ctk.CTkButton(
             button_frame,
             text="🔄 转换格式",
@@ -359,6 +799,7 @@ class RouteManagerGUI:
         self.context_menu.add_command(label="删除", command=self.delete_selected_route)
         self.context_menu.add_command(label="导出", command=self.export_selected_route)
         self.context_menu.add_command(label="查看详情", command=self.view_route_details)
+        self.context_menu.add_command(label="预览", command=self.preview_selected_route)
         
         self.tree.bind("<Button-3>", self.show_context_menu)
         self.tree.bind("<Double-1>", self.select_route)
@@ -436,7 +877,7 @@ class RouteManagerGUI:
         # 选择导出格式
         format_dialog = ctk.CTkToplevel()
         format_dialog.title("选择导出格式")
-        format_dialog.geometry("350x200")
+        format_dialog.geometry("350x330")
         format_dialog.transient()
         format_dialog.grab_set()
         
@@ -451,33 +892,27 @@ class RouteManagerGUI:
         
         format_var = ctk.StringVar(value="json")
         
-        ctk.CTkRadioButton(
-            main_dialog_frame,
-            text="JSON格式",
-            variable=format_var,
-            value="json",
-            font=ctk.CTkFont(size=14)
-        ).pack(pady=5)
-        
-        ctk.CTkRadioButton(
-            main_dialog_frame,
-            text="TXT格式",
-            variable=format_var,
-            value="txt",
-            font=ctk.CTkFont(size=14)
-        ).pack(pady=5)
+        for value, text in EXPORT_FORMATS:
+            ctk.CTkRadioButton(
+                main_dialog_frame,
+                text=text,
+                variable=format_var,
+                value=value,
+                font=ctk.CTkFont(size=14)
+            ).pack(pady=5)
         
         def do_export():
             format_dialog.destroy()
-            filetypes = [("JSON文件", "*.json"), ("文本文件", "*.txt")] if format_var.get() == "json" else [("文本文件", "*.txt"), ("JSON文件", "*.json")]
+            fmt = format_var.get()
+            filetypes = [(text, f"*.{value}") for value, text in EXPORT_FORMATS if value == fmt]
             export_path = filedialog.asksaveasfilename(
                 title="保存路径文件",
-                defaultextension=f".{format_var.get()}",
+                defaultextension=f".{fmt}",
                 filetypes=filetypes,
-                initialvalue=f"{route_name}.{format_var.get()}"
+                initialvalue=f"{route_name}.{fmt}"
             )
             if export_path:
-                if self.route_manager.export_route(file_path, export_path, format_var.get()):
+                if self.route_manager.export_route(file_path, export_path, fmt):
                     messagebox.showinfo("成功", "路径已导出")
                 else:
                     messagebox.showerror("错误", "导出失败")
@@ -562,6 +997,39 @@ class RouteManagerGUI:
         except Exception as e:
             messagebox.showerror("错误", f"读取路径详情失败: {e}")
             
+    def preview_selected_route(self):
+        """在地图窗口中预览选中的路径"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+            
+        item = selection[0]
+        file_path = self.tree.item(item, "tags")[0]
+        route_name = self.tree.item(item, "values")[0]
+        
+        try:
+            coordinates = self.route_manager.load_route_coordinates(file_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"读取路径失败: {e}")
+            return
+            
+        from map_view import MapCanvas
+        
+        preview_window = ctk.CTkToplevel(self.window)
+        preview_window.title(f"路径预览 - {route_name}")
+        preview_window.geometry("500x500")
+        preview_window.transient(self.window)
+        
+        canvas = MapCanvas(preview_window)
+        canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        canvas.set_route(coordinates)
+        
+        ctk.CTkLabel(
+            preview_window,
+            text=f"{len(coordinates)} 个坐标点",
+            font=ctk.CTkFont(size=12)
+        ).pack(pady=(0, 10))
+        
     def _create_detail_item(self, parent, label, value, multiline=False):
         """创建详情项"""
         item_frame = ctk.CTkFrame(parent, fg_color="transparent")
@@ -612,9 +1080,10 @@ class RouteManagerGUI:
     def import_route(self):
         """导入路径文件"""
         filetypes = [
-            ("所有支持的文件", "*.txt;*.json"),
+            ("所有支持的文件", "*.txt;*.json;*.gpx;*.kml;*.geojson"),
             ("文本文件", "*.txt"),
             ("JSON文件", "*.json"),
+            ("轨迹文件", "*.gpx;*.kml;*.geojson"),
             ("所有文件", "*.*")
         ]
         
@@ -625,26 +1094,76 @@ class RouteManagerGUI:
         
         if file_path:
             try:
+                new_path = self.route_manager.import_route_file(
+                    file_path, simplify_tolerance=self.simplify_tolerance
+                )
+                route_name = Path(new_path).stem
                 if file_path.endswith('.json'):
-                    # JSON文件直接复制
-                    route_data = self.route_manager.load_route_json(file_path)
-                    route_name = route_data['name']
-                    new_path = self.route_manager.routes_dir / f"{route_name}.json"
-                    
-                    import shutil
-                    shutil.copy2(file_path, new_path)
                     messagebox.showinfo("成功", f"路径 '{route_name}' 已导入")
                 else:
-                    # TXT文件转换为JSON
-                    route_name = Path(file_path).stem
-                    description = f"从 {Path(file_path).name} 导入"
-                    new_path = self.route_manager.convert_txt_to_json(file_path, route_name, description)
                     messagebox.showinfo("成功", f"路径 '{route_name}' 已导入并转换为JSON格式")
                     
                 self.refresh_route_list()
             except Exception as e:
                 messagebox.showerror("错误", f"导入失败: {e}")
                 
+    def batch_import_routes(self):
+        """批量导入目录中的路径文件（后台进程池处理，不阻塞界面）"""
+        directory = filedialog.askdirectory(title="选择要批量导入的目录")
+        if not directory:
+            return
+            
+        file_paths = self.route_manager.collect_route_files(directory)
+        if not file_paths:
+            messagebox.showwarning("提示", "目录中没有可导入的路径文件")
+            return
+            
+        window = self.window
+        window.title(f"路径管理器 - 正在导入 0/{len(file_paths)}")
+        # Tk 不是线程安全的：后台线程只把进度放进队列，由 Tk 线程定时取出
+        updates = queue.Queue()
+        
+        def progress(done, total, result):
+            updates.put(("progress", (done, total)))
+            
+        def finish(results):
+            failed = [r for r in results if r["error"]]
+            window.title("路径管理器")
+            self.refresh_route_list()
+            message = f"成功导入 {len(results) - len(failed)} 个路径"
+            renamed = [r for r in results if r.get("note")]
+            if renamed:
+                message += f"，{len(renamed)} 个重名:\n" + "\n".join(
+                    f"{Path(r['source']).name}: {r['note']}" for r in renamed[:10]
+                )
+            if failed:
+                message += f"，{len(failed)} 个失败:\n" + "\n".join(
+                    f"{Path(r['source']).name}: {r['error']}" for r in failed[:10]
+                )
+            messagebox.showinfo("批量导入完成", message)
+            
+        def worker():
+            results = self.route_manager.batch_import(
+                file_paths, progress=progress, simplify_tolerance=self.simplify_tolerance
+            )
+            updates.put(("finish", results))
+            
+        def drain():
+            try:
+                while True:
+                    kind, data = updates.get_nowait()
+                    if kind == "finish":
+                        finish(data)
+                        return
+                    window.title(f"路径管理器 - 正在导入 {data[0]}/{data[1]}")
+            except queue.Empty:
+                pass
+            if window.winfo_exists():
+                window.after(100, drain)
+            
+        threading.Thread(target=worker, daemon=True).start()
+        window.after(100, drain)
+                
     def convert_format(self):
         """转换格式"""
         selection = self.tree.selection()
@@ -7,7 +7,8 @@ automatically run the route
 import math
 import time
 import random
-import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from geopy.distance import geodesic
 
@@ -15,50 +16,12 @@ from pymobiledevice3.remote.remote_service_discovery import RemoteServiceDiscove
 from pymobiledevice3.services.dvt.instruments.location_simulation import LocationSimulation
 from pymobiledevice3.services.dvt.dvt_secure_socket_proxy import DvtSecureSocketProxyService
 
-def bd09Towgs84(position):
-    wgs_p = {}
+from util.clock import REAL_CLOCK
+from util.coord import bd09Towgs84
+from util.eventlog import event
+from util.trajectory import resample, speed_profile
 
-    x_pi = 3.14159265358979324 * 3000.0 / 180.0
-    pi = 3.141592653589793238462643383  # π
-    a = 6378245.0  # 长半轴
-    ee = 0.00669342162296594323  # 偏心率平方
-
-    def transform_lat(x, y):
-        ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
-        ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
-        ret += (20.0 * math.sin(y * pi) + 40.0 * math.sin(y / 3.0 * pi)) * 2.0 / 3.0
-        ret += (160.0 * math.sin(y / 12.0 * pi) + 320 * math.sin(y * pi / 30.0)) * 2.0 / 3.0
-        return ret
-
-    def transform_lon(x, y):
-        ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
-        ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
-        ret += (20.0 * math.sin(x * pi) + 40.0 * math.sin(x / 3.0 * pi)) * 2.0 / 3.0
-        ret += (150.0 * math.sin(x / 12.0 * pi) + 300.0 * math.sin(x / 30.0 * pi)) * 2.0 / 3.0
-        return ret
-
-    x = position['lng'] - 0.0065
-    y = position['lat'] - 0.006
-    z = math.sqrt(x * x + y * y) - 0.00002 * math.sin(y * x_pi)
-    theta = math.atan2(y, x) - 0.000003 * math.cos(x * x_pi)
-
-    gcj_lng = z * math.cos(theta)
-    gcj_lat = z * math.sin(theta)
-
-    d_lat = transform_lat(gcj_lng - 105.0, gcj_lat - 35.0)
-    d_lng = transform_lon(gcj_lng - 105.0, gcj_lat - 35.0)
-
-    rad_lat = gcj_lat / 180.0 * pi
-    magic = math.sin(rad_lat)
-    magic = 1 - ee * magic * magic
-    sqrt_magic = math.sqrt(magic)
-
-    d_lng = (d_lng * 180.0) / (a / sqrt_magic * math.cos(rad_lat) * pi)
-    d_lat = (d_lat * 180.0) / (a * (1 - ee) / (magic * sqrt_magic) * pi)
-
-    wgs_p["lat"] = gcj_lat * 2 - gcj_lat - d_lat
-    wgs_p["lng"] = gcj_lng * 2 - gcj_lng - d_lng
-    return wgs_p
+logger = logging.getLogger("iosrealrun.run")
 
 # get the ditance according to the latitude and longitude
 def geodistance(p1, p2):
@@ -110,54 +73,252 @@ def randLoc(loc: list, d=0.000025, n=5):
         result[j]["lng"] +=  (result[j]["lng"]-center["lng"])/distance*offset*smooth(start, end, j)
     return result
 
-def fixLockT(loc: list, v, dt):
-    fixedLoc = []
-    t = 0
-    T = []
-    T.append(geodistance(loc[1],loc[0])/v)
-    a = loc[0].copy()
-    b = loc[1].copy()
+def fixLockT(loc: list, v, dt, closed=True):
+    """按速度 v 把路径插值为间隔 dt 的位置序列
+
+    closed 为 True 时最后一个点会连回起点；为 False 时按开放折线处理，
+    用于从一圈的中途重新规划剩余路线。相邻两点的直线距离都等于 v*dt，
+    不再按线段取整步数，短线段和拐角处的实际速度也与 v 一致。
+    """
+    path = loc + [loc[0]] if closed else loc
+    return resample(path, v, dt)[0]
+
+def planLap(path: list, v, dt, n=None, dense=None):
+    """规划开放折线 path 上实际发送的位置序列
+
+    先按速度采样，再加随机偏移；偏移会改变相邻点的间距，因此加偏移后
+    按同样的速度重新采样一次，保证发送的点之间仍然是 v*dt。
+
+    dense 为共享内存中的路径（util/shared_route.SharedRoute，path 须为完整一圈）时，
+    直接在其预先加密好的基准轨迹上规划，返回的两个序列在发送时才逐点计算，不复制基准轨迹。
+
+    Returns:
+        (未加偏移的位置序列, 实际发送的位置序列)，两者长度相同、下标一一对应
+    """
+    if len(path) < 2:
+        return [], []
+    if n is None:
+        nList = (5, 6, 7, 8, 9)
+        n = nList[random.randint(0, len(nList)-1)]
+    if dense is not None:
+        return dense.lap(v, dt, path[-1], n)
+    base = fixLockT(path, v, dt, closed=False)
+    ticks = resample(randLoc(base, n=n) + [path[-1]], v, dt)[0]  # a path will be divided into n parts for random route
+    # 两者的点数最多相差一两个，用最后一个点补齐
+    base = (base + [base[-1]]*len(ticks))[:len(ticks)]
+    return base, ticks
+
+def remainingPath(path: list, traveled):
+    """开放折线 path 上走过 traveled 米之后剩下的部分（第一个点为当前位置）"""
+    for k in range(len(path)-1):
+        d = geodistance(path[k], path[k+1])
+        if traveled < d:
+            r = traveled/d
+            point = {
+                "lat": path[k]["lat"] + r*(path[k+1]["lat"]-path[k]["lat"]),
+                "lng": path[k]["lng"] + r*(path[k+1]["lng"]-path[k]["lng"])
+            }
+            return [point] + path[k+1:]
+        traveled -= d
+    return [path[-1]]
+
+def run1(location, loc: list, v, dt=0.2, fixedLoc=None, clock=REAL_CLOCK, until=None, journal=None, lap=0):
+    """跑一圈，fixedLoc 为预先规划好的位置序列，省略时当场规划
+
+    location 为 LocationSimulation（或同样提供 set 的假设备），按 clock 的绝对时刻
+    发送；给出 until 时到该时刻为止。给出 journal（util.journal.JournalWriter）时
+    记录每个发送的位置，lap 为记录中的圈号。
+
+    Returns:
+        发送的点数
+    """
+    if fixedLoc is None:
+        _, fixedLoc = planLap(loc + [loc[0]], v, dt)
+    trace = logger.isEnabledFor(logging.DEBUG)
+    start = clock.now()
+    for k, i in enumerate(fixedLoc):
+        if until is not None and clock.now() >= until:
+            return k
+        point = bd09Towgs84(i)
+        sent = time.perf_counter()
+        location.set(point["lat"], point["lng"])
+        latency = time.perf_counter()-sent
+        if journal is not None:
+            journal.record(lap, k, point["lat"], point["lng"], latency, clock.wall())
+        if trace:
+            event(logger, "tick", logging.DEBUG, lap=lap, tick=k, lat=point["lat"], lng=point["lng"],
+                  late=clock.now()-start-k*dt, latency=latency)
+        clock.sleep_until(start + (k+1)*dt)
+    return len(fixedLoc)
+
+def resampleTrack(track: list, dt, scale=1.0):
+    """按轨迹自带的时间轴重采样，得到间隔为 dt 的位置序列
+
+    track 中的点需要带 time（Unix 时间戳），scale > 1 表示加速回放。
+    整条时间线一次性算好，回放时每个 tick 只需取下一个点。
+    """
+    if not scale > 0:
+        raise ValueError(f"回放倍速必须为正数: {scale}")
+    points = sorted((p for p in track if p.get("time") is not None), key=lambda p: p["time"])
+    if len(points) < 2:
+        raise ValueError("轨迹中带时间戳的点少于 2 个，无法按时间回放")
+    t0 = points[0]["time"]
+    end = points[-1]["time"]
+    step = dt * scale
+    timeline = []
     j = 0
-    while t < T[0]:
-        xa = a["lat"] + j*(b["lat"]-a["lat"])/(max(1, int(T[0]/dt)))
-        xb = a["lng"] + j*(b["lng"]-a["lng"])/(max(1, int(T[0]/dt)))
-        fixedLoc.append({"lat": xa, "lng": xb})
-        j += 1
-        t += dt
-    for i in range(1, len(loc)):
-        T.append(geodistance(loc[(i+1)%len(loc)],loc[i])/v + T[-1])
-        a = loc[i].copy()
-        b = loc[(i+1)%len(loc)].copy()
-        j = 0
-        while t < T[i]:
-            xa = a["lat"] + j*(b["lat"]-a["lat"])/(max(1, int((T[i]-T[i-1])/dt)))
-            xb = a["lng"] + j*(b["lng"]-a["lng"])/(max(1, int((T[i]-T[i-1])/dt)))
-            fixedLoc.append({"lat": xa, "lng": xb})
+    t = t0
+    while t <= end:
+        while j < len(points) - 2 and points[j+1]["time"] <= t:
             j += 1
-            t += dt
-    return fixedLoc
-
-def run1(dvt, loc: list, v, dt=0.2):
-    fixedLoc = fixLockT(loc, v, dt)
-    nList = (5, 6, 7, 8, 9)
-    n = nList[random.randint(0, len(nList)-1)]
-    fixedLoc = randLoc(fixedLoc, n=n)  # a path will be divided into n parts for random route
-    clock = time.time()
-    for i in fixedLoc:
-        LocationSimulation(dvt).set(*bd09Towgs84(i).values())
-        while time.time()-clock < dt:
-            pass
-        clock = time.time()
-
-async def run(address, port, loc: list, v, d=15):
+        a = points[j]
+        b = points[j+1]
+        span = b["time"] - a["time"]
+        r = 0 if span <= 0 else min(1, max(0, (t - a["time"]) / span))
+        timeline.append({
+            "lat": a["lat"] + r*(b["lat"]-a["lat"]),
+            "lng": a["lng"] + r*(b["lng"]-a["lng"])
+        })
+        # 用乘法而不是累加，避免长轨迹的浮点误差累积
+        t = t0 + len(timeline)*step
+    return timeline
+
+def runTrack(location, timeline: list, dt=0.2, clock=REAL_CLOCK):
+    """按绝对时刻发送预先计算好的时间线，不会因为单次发送耗时而累积漂移"""
+    start = clock.now()
+    for k, i in enumerate(timeline):
+        location.set(*bd09Towgs84(i).values())
+        clock.sleep_until(start + (k+1)*dt)
+
+async def connectDvt(address, port, timer=None):
+    """等隧道端口可连接后连接 RSD 并完成 DVT 握手，timer（PhaseTimer）记录各阶段耗时"""
+    from init.tunnel import wait_ready
+    from util.phases import PhaseTimer
+
+    timer = timer or PhaseTimer(lambda message: None)
+    with timer.phase("等待隧道就绪"):
+        await wait_ready(address, port)
+    with timer.phase("RSD 连接"):
+        rsd = RemoteServiceDiscoveryService((address, port))
+        await rsd.connect()
+    with timer.phase("DVT 握手"):
+        dvt = DvtSecureSocketProxyService(rsd)
+        dvt.perform_handshake()
+    return dvt
+
+async def replay(address, port, track: list, dt=0.2, scale=1.0, loop=False, timer=None):
+    timeline = resampleTrack(track, dt, scale)
+    dvt = await connectDvt(address, port, timer)
+    if timer is not None:
+        timer.log(timer.summary())
+
+    location = LocationSimulation(dvt)
+
+    def play():
+        while True:
+            runTrack(location, timeline, dt)
+            event(logger, "replay", message="轨迹回放完成", ticks=len(timeline))
+            if not loop:
+                break
+
+    if timer is None:
+        play()
+        return
+    with timer.phase("跑步"):
+        play()
+
+async def run(address, port, loc: list, v, d=15, journal=None, timer=None, pace=None):
+    dvt = await connectDvt(address, port, timer)
+    if timer is not None:
+        timer.log(timer.summary())
+
+    if timer is None:
+        runLaps(LocationSimulation(dvt), loc, v, d, journal=journal, pace=pace)
+        return
+    with timer.phase("跑步"):
+        runLaps(LocationSimulation(dvt), loc, v, d, journal=journal, pace=pace)
+
+def compilePace(pace, loc: list, dt=0.2, dense=None):
+    """把配速方案（util.pace.PaceProfile）编译为逐圈的发送序列，与引擎的做法相同
+
+    Returns:
+        [(实际发送的位置序列, 速度统计), ...]
+    """
+    start = time.perf_counter()
+    path = loc + [loc[0]]
+    tables = [
+        (ticks, speed_profile([*ticks, loc[0]], dt, window=int(round(1/dt))))
+        for _, ticks in pace.compile(path, dt, lambda p, s, dt: planLap(p, s, dt, dense=dense))
+    ]
+    event(logger, "pace", phases=len(pace.phases), duration=pace.duration, laps=len(tables),
+          message=f"配速方案共 {len(pace.phases)} 个阶段，时长 {pace.duration / 60:.1f} 分钟，"
+                  f"编译为 {len(tables)} 圈，用时 {(time.perf_counter() - start) * 1000:.0f} 毫秒")
+    return tables
+
+def runLaps(location, loc: list, v, d=15, dt=0.2, clock=REAL_CLOCK, duration=None, onLap=None, dense=None,
+            journal=None, pace=None):
+    """循环跑圈，直到跑满 duration 秒（省略时无限循环）
+
+    onLap(lap, vRand, report) 在每圈开始时调用，省略时记录上一圈的速度统计；
+    按配速方案的圈 vRand 为 None。
+    日志都经 logger（util/eventlog.py 的队列）输出，发送线程不做终端 IO。
+    dense 为共享内存中的基准轨迹，见 planLap。给出 pace（util.pace.PaceProfile）时
+    先按方案跑，方案结束后按方案最后的速度继续。
+
+    Returns:
+        (圈数, 发送的点数)
+    """
     random.seed(time.time())
-    rsd = RemoteServiceDiscoveryService((address, port))
-    await asyncio.sleep(2)
-    await rsd.connect()
-    dvt = DvtSecureSocketProxyService(rsd)
-    dvt.perform_handshake()
+    tables = compilePace(pace, loc, dt, dense) if pace is not None else []
+    if pace is not None:
+        v = pace.final_speed
 
-    while True:
+    def planNext():
+        if tables:
+            fixedLoc, report = tables.pop(0)
+            return None, fixedLoc, report
         vRand = 1000/(1000/v-(2*random.random()-1)*d)
-        run1(dvt, loc, vRand)
-        print("跑完一圈了")
\ No newline at end of file
+        fixedLoc = planLap(loc + [loc[0]], vRand, dt, dense=dense)[1]
+        return vRand, fixedLoc, speed_profile([*fixedLoc, loc[0]], dt, target=vRand, window=int(round(1/dt)))
+
+    until = None if duration is None else clock.now() + duration
+    lap = 0
+    ticks = 0
+    # 当前圈发送的同时在后台线程规划下一圈，圈与圈之间不会停顿
+    with ThreadPoolExecutor(max_workers=1) as planner:
+        upcoming = planner.submit(planNext)
+        while until is None or clock.now() < until:
+            vRand, fixedLoc, report = upcoming.result()
+            upcoming = planner.submit(planNext)
+            lap += 1
+            target = "按配速方案" if vRand is None else f"目标速度 {vRand:.2f} m/s"
+            event(logger, "lap", lap=lap, target=vRand, message=f"第 {lap} 圈，{target}", **report)
+            if onLap is not None:
+                onLap(lap, vRand, report)
+            ticks += run1(location, loc, vRand, dt, fixedLoc, clock, until, journal, lap)
+            if onLap is None:
+                event(logger, "lap_done", lap=lap, target=vRand, mean=report["mean"],
+                      message=f"跑完一圈了，{target}，实际平均 {report['mean']:.2f} m/s，"
+                              f"1 秒内 {report['min']:.2f}~{report['max']:.2f} m/s")
+        upcoming.cancel()
+    return lap, ticks
+
+def simulate(loc: list, v, output, duration=1800, d=15, dt=0.2, pace=None):
+    """不连接设备，用虚拟时钟跑 duration 秒，把发送的位置写入 output（CSV）
+
+    pace 为配速方案（util.pace.PaceProfile），见 runLaps
+
+    Returns:
+        (圈数, 发送的点数)
+    """
+    from util.clock import VirtualClock
+    from util.fake_device import RecordingLocation
+
+    clock = VirtualClock()
+    with open(output, 'w', encoding='utf-8') as f:
+        device = RecordingLocation(f, clock)
+
+        def onLap(lap, vRand, report):
+            device.lap = lap
+
+        return runLaps(device, loc, v, d, dt, clock, duration, onLap, pace=pace)
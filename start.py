@@ -9,13 +9,165 @@ import os
 import argparse
 
 
+def positive_float(value):
+    """argparse 类型：正数"""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"必须为正数: {value}")
+    return number
+
+
+def routes_command(args):
+    """路径管理子命令: routes import / routes convert"""
+    from route_manager import RouteManager
+    
+    manager = RouteManager(args.routes_dir)
+    file_paths = manager.collect_route_files(args.source)
+    if not file_paths:
+        print(f"{args.source} 中没有可处理的路径文件")
+        sys.exit(1)
+        
+    def progress(done, total, result):
+        status = "失败: " + result["error"] if result["error"] else "完成"
+        if result.get("note"):
+            status += f"（{result['note']}）"
+        print(f"[{done}/{total}] {result['source']} {status}")
+        
+    if args.routes_command == "import":
+        results = manager.batch_import(
+            file_paths, workers=args.workers, progress=progress,
+            simplify_tolerance=args.simplify
+        )
+    else:
+        results = manager.batch_export(
+            file_paths, args.output, args.format, workers=args.workers, progress=progress
+        )
+        
+    failed = sum(1 for r in results if r["error"])
+    print(f"共 {len(results)} 个文件，成功 {len(results) - failed} 个，失败 {failed} 个")
+    if failed:
+        sys.exit(1)
+
+
+def analyze_command(args):
+    """跑后分析子命令: analyze 会话日志(.irj) 或路径文件"""
+    import time
+    from util import analysis
+    
+    start = time.perf_counter()
+    if args.file.endswith('.irj'):
+        columns, dt = analysis.load_journal(args.file)
+    else:
+        columns, dt = analysis.load_route(args.file, args.speed, args.dt, args.laps)
+    result = analysis.analyze(
+        columns, dt, window=args.window, max_speed=args.max_speed,
+        stop_speed=args.stop_speed, min_stop=args.min_stop
+    )
+    elapsed = time.perf_counter() - start
+    
+    summary = result["summary"]
+    print(f"{summary['ticks']} 个点，{summary['duration'] / 60:.1f} 分钟，{summary['distance']:.0f} 米，"
+          f"平均 {summary['mean']:.2f} m/s（配速 {analysis.format_pace(summary['pace'])}），分析用时 {elapsed:.2f} 秒")
+    print(f"{'圈':>4} {'点数':>6} {'距离(米)':>9} {'时长(秒)':>9} {'平均(m/s)':>9} {'配速':>7} {'窗口速度(m/s)':>14}")
+    for lap in result["laps"]:
+        print(f"{lap['lap']:>4} {lap['ticks']:>6} {lap['distance']:>9.1f} {lap['duration']:>9.1f} {lap['mean']:>9.2f} "
+              f"{analysis.format_pace(lap['pace']):>7} {lap['min']:>6.2f}~{lap['max']:<6.2f}")
+    anomalies = result["anomalies"]
+    print(f"异常 {len(anomalies)} 处")
+    for a in anomalies[:args.limit]:
+        unit = "秒" if a["kind"] == "gap" else "m/s"
+        print(f"  {a['kind']:<5} 第 {a['lap']} 圈 {a['start']:.1f}~{a['end']:.1f} 秒  {a['value']:.2f} {unit}")
+    if len(anomalies) > args.limit:
+        print(f"  ……另有 {len(anomalies) - args.limit} 处")
+    
+    if args.csv:
+        analysis.write_csv(args.csv, columns, result)
+        print(f"逐点数据已导出到 {args.csv}")
+    if args.laps_csv:
+        analysis.write_laps_csv(args.laps_csv, result)
+        print(f"每圈统计已导出到 {args.laps_csv}")
+
+
 def main():
     parser = argparse.ArgumentParser(description='iOS Real Run - 跑步模拟器')
     parser.add_argument('--gui', action='store_true', help='启动GUI界面')
     parser.add_argument('--cli', action='store_true', help='启动命令行界面')
+    parser.add_argument('--daemon', action='store_true', help='以无界面守护模式运行，通过本地HTTP接口控制')
+    parser.add_argument('--host', default='127.0.0.1', help='守护模式监听地址，默认 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='守护模式监听端口，默认 8765')
+    parser.add_argument('--socket', metavar='PATH', help='守护模式改为监听 Unix socket（仅macOS/Linux）')
+    parser.add_argument('--replay', metavar='FILE', help='命令行模式下按原始时间回放带时间戳的GPX/KML轨迹')
+    parser.add_argument('--time-scale', type=positive_float, default=1.0, help='回放倍速，默认 1.0')
+    parser.add_argument('--loop', action='store_true', help='回放结束后从头循环')
+    parser.add_argument('--simulate', metavar='FILE', help='不连接设备，用虚拟时钟快速跑完并把发送的位置写入 CSV 文件')
+    parser.add_argument('--duration', type=float, default=1800, help='--simulate 的模拟时长（秒），默认 1800')
+    parser.add_argument('--profile', nargs='?', const='profiles', metavar='DIR',
+                        help='对初始化、隧道、读取路径、连接和跑步各阶段做 cProfile/tracemalloc 分析，报告写入 DIR（默认 profiles）')
+    
+    subparsers = parser.add_subparsers(dest='command')
+    routes_parser = subparsers.add_parser('routes', help='批量管理路径文件')
+    routes_subparsers = routes_parser.add_subparsers(dest='routes_command', required=True)
+    
+    import_parser = routes_subparsers.add_parser('import', help='批量导入目录中的路径文件')
+    import_parser.add_argument('source', help='要导入的目录或文件')
+    import_parser.add_argument('--simplify', type=float, metavar='METERS', help='导入时按容差简化路径')
+    
+    convert_parser = routes_subparsers.add_parser('convert', help='批量转换路径文件格式')
+    convert_parser.add_argument('source', help='要转换的目录或文件')
+    convert_parser.add_argument('--output', required=True, help='输出目录')
+    convert_parser.add_argument('--format', choices=['json', 'txt', 'gpx', 'kml', 'geojson'], default='json', help='输出格式')
+    
+    for sub in (import_parser, convert_parser):
+        sub.add_argument('--workers', type=int, help='并行进程数，默认为CPU核数')
+        sub.add_argument('--routes-dir', default='routes', help='路径目录')
+    
+    analyze_parser = subparsers.add_parser('analyze', help='分析会话日志或路径的配速、每圈距离和异常')
+    analyze_parser.add_argument('file', help='会话日志（.irj）或路径文件')
+    analyze_parser.add_argument('--window', type=float, default=5.0, help='滑动窗口（秒），默认 5')
+    analyze_parser.add_argument('--max-speed', type=float, default=8.0, help='瞬时速度超过该值（m/s）视为异常，默认 8')
+    analyze_parser.add_argument('--stop-speed', type=float, default=0.5, help='瞬时速度低于该值（m/s）视为停下，默认 0.5')
+    analyze_parser.add_argument('--min-stop', type=float, default=3.0, help='停下超过该时长（秒）才报告，默认 3')
+    analyze_parser.add_argument('--speed', type=float, default=4.2, help='分析路径文件时按该速度规划，默认 4.2')
+    analyze_parser.add_argument('--dt', type=float, default=0.2, help='分析路径文件时的发送间隔（秒），默认 0.2')
+    analyze_parser.add_argument('--laps', type=int, default=1, help='分析路径文件时规划的圈数，默认 1')
+    analyze_parser.add_argument('--csv', metavar='FILE', help='导出逐点数据')
+    analyze_parser.add_argument('--laps-csv', metavar='FILE', help='导出每圈统计')
+    analyze_parser.add_argument('--limit', type=int, default=20, help='最多列出的异常数，默认 20')
     
     args = parser.parse_args()
     
+    if args.profile:
+        # 通过环境变量传给引擎进程，见 util/phases.py
+        from util.phases import PROFILE_ENV
+        os.environ[PROFILE_ENV] = os.path.abspath(args.profile)
+        print(f"性能分析报告将写入 {os.environ[PROFILE_ENV]}")
+    
+    if args.command == 'routes':
+        routes_command(args)
+        return
+    if args.command == 'analyze':
+        analyze_command(args)
+        return
+    
+    if args.daemon:
+        import logging
+        import coloredlogs
+        from daemon import serve
+        coloredlogs.install(level=logging.INFO)
+        print("启动守护模式...")
+        serve(args.host, args.port, args.socket)
+        return
+    
+    if args.simulate:
+        from main import simulate
+        simulate(args.simulate, args.duration)
+        return
+    
+    # 回放轨迹只支持命令行模式
+    if args.replay:
+        args.cli = True
+        args.gui = False
+    
     # 如果没有指定模式，默认启动GUI
     if not args.cli and not args.gui:
         args.gui = True
@@ -40,7 +192,7 @@ def main():
             from main import main as cli_main
             import asyncio
             print("启动命令行界面...")
-            asyncio.run(cli_main())
+            asyncio.run(cli_main(args.replay, args.time_scale, args.loop))
         except Exception as e:
             print(f"启动命令行模式失败: {e}")
             sys.exit(1)
@@ -0,0 +1,92 @@
+"""
+importtime_budget.py
+检查各入口模块的导入耗时
+
+在子进程中用 python -X importtime 导入模块，取多次运行中的最小值与预算比较，
+并检查导入过程中是否加载了只应在运行时才需要的重量级依赖。
+
+用法（在项目根目录）:
+    python tools/importtime_budget.py
+    python tools/importtime_budget.py --runs 5 gui engine
+
+超出预算或加载了禁止的依赖时以退出码 1 结束。
+"""
+import re
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 模块 -> 导入耗时预算（毫秒，包含其导入的所有模块）
+BUDGETS = {
+    "start": 50,
+    "config": 30,
+    "engine": 80,
+    "main": 80,
+    "daemon": 150,
+    "route_manager": 400,
+    "gui": 500,
+}
+
+# 导入入口模块时不应加载的依赖：设备通信、距离计算和日志美化都只在运行时需要
+FORBIDDEN = ("pymobiledevice3", "geopy", "coloredlogs", "yaml")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def measure(module):
+    """
+    导入一次模块
+
+    Returns:
+        (累计耗时毫秒, 导入的模块名集合)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    total = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        imported.add(match.group(4))
+        if match.group(4) == module and not match.group(3):
+            total = int(match.group(2)) / 1000
+    return total, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查入口模块的导入耗时")
+    parser.add_argument("modules", nargs="*", help="要检查的模块，默认检查全部")
+    parser.add_argument("--runs", type=int, default=3, help="每个模块导入的次数，取最小值")
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数，较慢的机器上可以放宽")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules or BUDGETS:
+        budget = BUDGETS.get(module, 100) * args.scale
+        try:
+            runs = [measure(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<15} 导入失败: {e}")
+            failed = True
+            continue
+        best = min(t for t, _ in runs)
+        heavy = sorted(name for name in runs[0][1] if name.split(".")[0] in FORBIDDEN)
+        ok = best <= budget and not heavy
+        failed |= not ok
+        print(f"{module:<15} {best:8.1f} ms / {budget:.0f} ms  {'OK' if ok else 'FAIL'}")
+        if heavy:
+            print(f"{'':<15} 不应在导入时加载: {', '.join(sorted({n.split('.')[0] for n in heavy}))}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
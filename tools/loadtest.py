@@ -0,0 +1,219 @@
+"""
+loadtest.py
+多会话压力测试
+
+逐级增加同时运行的模拟会话数 N，每个会话是一个独立进程，运行与命令行模式
+相同的 run.runLaps（后台规划下一圈、真实的轨迹规划和随机偏移、按绝对时刻发送），
+只是把定位设备换成向本机 UDP 假端点发包的 UdpLocation。路径只解析一次，通过
+共享内存（util/shared_route.py）发布给所有会话。
+
+假端点记录每个包的到达时刻，统计：
+    slip     到达时刻相对于计划时刻（第一个包 + tick * dt）的偏差
+    jitter   相邻两个包的间隔相对于 dt 的偏差
+    latency  发送到到达的耗时
+以及每个会话的 CPU 占用和峰值内存。p99 jitter 超过 --max-jitter 时停止增加。
+
+UdpLocation 只发一个固定格式的 UDP 包，不经过 pymobiledevice3 的 DVT 消息序列化和
+RSD/隧道的传输，结果只反映规划和发送节奏本身的开销，是真实设备上容量的上限。
+某个会话进程崩溃或超时未返回时，该级测试报错退出，不会一直等待。
+
+用法（在项目根目录）:
+    python tools/loadtest.py
+    python tools/loadtest.py --ramp 1,4,16,64 --duration 20 routes/HNroute.json
+"""
+import sys
+import time
+import queue
+import socket
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DT = 0.2
+# 会话结束后等待其返回统计结果的最长时间（秒）
+RESULT_GRACE = 10.0
+
+
+def percentile(values, q):
+    """最近秩百分位，values 需已排序"""
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+class Endpoint:
+    """本机 UDP 假端点，在后台线程中记录每个包的到达时刻"""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.address = self.sock.getsockname()
+        self.packets = {}
+        self.running = True
+        self.thread = threading.Thread(target=self._receive, daemon=True)
+        self.thread.start()
+
+    def _receive(self):
+        from util.fake_device import PACKET
+
+        while self.running:
+            try:
+                data = self.sock.recv(PACKET.size)
+            except socket.timeout:
+                continue
+            received = time.perf_counter()
+            session, tick, sent, _, _ = PACKET.unpack(data)
+            self.packets.setdefault(session, []).append((tick, sent, received))
+
+    def take(self):
+        packets, self.packets = self.packets, {}
+        return packets
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+def session(index, url, address, speed, duration, start_at, results):
+    """压力测试中的一个会话（子进程）"""
+    from run import runLaps
+    from util.clock import REAL_CLOCK
+    from util.fake_device import UdpLocation
+    from util.shared_route import SharedRoute
+
+    shared = SharedRoute.attach(url)
+    device = UdpLocation(address, index)
+    loc = shared.coordinates()
+    # 所有会话同时开始，perf_counter 在同一台机器的进程之间可比
+    REAL_CLOCK.sleep_until(start_at)
+    cpu = time.process_time()
+    laps, ticks = runLaps(device, loc, speed, dt=DT, duration=duration, onLap=lambda *_: None, dense=shared)
+    cpu = time.process_time() - cpu
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024  # macOS 为字节，Linux 为 KB
+    except ImportError:
+        rss = None
+    device.close()
+    shared.close()
+    results.put((index, laps, ticks, cpu, rss))
+
+
+def summarize(packets, stats, duration):
+    slips, jitters, latencies = [], [], []
+    received = 0
+    for rows in packets.values():
+        rows.sort()
+        received += len(rows)
+        anchor = rows[0][2]
+        for k, (tick, sent, arrived) in enumerate(rows):
+            slips.append(abs(arrived - anchor - tick * DT))
+            latencies.append(arrived - sent)
+            if k:
+                jitters.append(abs(arrived - rows[k - 1][2] - (tick - rows[k - 1][0]) * DT))
+    for values in (slips, jitters, latencies):
+        values.sort()
+    sent = sum(s[2] for s in stats)
+    rss = [s[4] for s in stats if s[4] is not None]
+    return {
+        "sent": sent,
+        "received": received,
+        "slip": [percentile(slips, q) * 1000 for q in (50, 95, 99, 100)],
+        "jitter": [percentile(jitters, q) * 1000 for q in (50, 95, 99, 100)],
+        "latency99": percentile(latencies, 99) * 1000,
+        "cpu": sum(s[3] for s in stats) / len(stats) / duration,
+        "rss": sum(rss) / len(rss) if rss else None,
+    }
+
+
+def run_step(n, url, endpoint, speed, duration):
+    """同时运行 n 个会话，返回统计结果"""
+    results = multiprocessing.Queue()
+    start_at = time.perf_counter() + 1.0 + 0.05 * n
+    workers = [
+        multiprocessing.Process(target=session, args=(i, url, endpoint.address, speed, duration, start_at, results))
+        for i in range(n)
+    ]
+    for w in workers:
+        w.start()
+    stats = {}
+    deadline = start_at + duration + RESULT_GRACE
+    try:
+        while len(stats) < n:
+            try:
+                result = results.get(timeout=0.5)
+            except queue.Empty:
+                # 进程已退出但没有放入结果，说明会话出错
+                dead = [i for i, w in enumerate(workers) if i not in stats and not w.is_alive()]
+                if dead:
+                    try:
+                        result = results.get(timeout=0.5)
+                    except queue.Empty:
+                        codes = ", ".join(f"#{i}（退出码 {workers[i].exitcode}）" for i in dead)
+                        raise RuntimeError(f"N = {n} 时会话进程异常退出: {codes}")
+                elif time.perf_counter() > deadline:
+                    raise RuntimeError(f"N = {n} 时有 {n - len(stats)} 个会话超时未返回结果")
+                else:
+                    continue
+            stats[result[0]] = result
+    finally:
+        for w in workers:
+            w.join(timeout=1)
+            if w.is_alive():
+                w.terminate()
+                w.join()
+    stats = list(stats.values())
+    time.sleep(0.3)  # 等待最后的包到达
+    return summarize(endpoint.take(), stats, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话压力测试")
+    parser.add_argument("route", nargs="?", default=str(ROOT / "routes" / "HNroute.json"), help="路径文件")
+    parser.add_argument("--ramp", default="1,2,4,8,16,32", help="逐级的会话数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10.0, help="每级运行的时长（秒）")
+    parser.add_argument("--speed", type=float, default=4.2, help="速度（米/秒）")
+    parser.add_argument("--max-jitter", type=float, default=20.0, help="p99 jitter 超过该值（毫秒）时停止增加")
+    args = parser.parse_args()
+
+    from route_manager import RouteManager
+    from util.shared_route import SharedRoute
+
+    loc = RouteManager(str(ROOT / "routes")).load_route_coordinates(args.route)
+    endpoint = Endpoint()
+    print(f"{Path(args.route).name}（{len(loc)} 个点），每级 {args.duration:.0f} 秒，dt = {DT} 秒，"
+          f"CPU 核数 {multiprocessing.cpu_count()}")
+    print("注意：UDP 假端点不经过 DVT 序列化和 RSD 隧道，结果是真实设备上容量的上限")
+    print(f"{'N':>4} {'收到/发送':>13}  {'slip p50/p95/p99/max (ms)':>28}  "
+          f"{'jitter p50/p95/p99/max (ms)':>28}  {'延迟p99':>7}  {'CPU/会话':>8}  {'内存/会话':>9}")
+    capacity = None
+    try:
+        with SharedRoute.publish(loc, spacing=args.speed * DT) as shared:
+            for n in (int(x) for x in args.ramp.split(",")):
+                r = run_step(n, shared.url, endpoint, args.speed, args.duration)
+                rss = f"{r['rss']:.0f} MB" if r["rss"] is not None else "-"
+                print(f"{n:>4} {r['received']:>6}/{r['sent']:<6}  "
+                      f"{'/'.join(f'{x:.1f}' for x in r['slip']):>28}  "
+                      f"{'/'.join(f'{x:.1f}' for x in r['jitter']):>28}  "
+                      f"{r['latency99']:>5.2f}ms  {r['cpu']:>8.1%}  {rss:>9}")
+                if r["jitter"][2] > args.max_jitter or r["received"] < r["sent"]:
+                    break
+                capacity = n
+    finally:
+        endpoint.close()
+    if capacity is None:
+        print(f"单个会话的 p99 jitter 已超过 {args.max_jitter} ms")
+    else:
+        print(f"p99 jitter 不超过 {args.max_jitter} ms 且不丢包的最大会话数: {capacity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+validate_speed.py
+检查轨迹规划的实际速度
+
+对自带的路径（routes/ 下的 JSON 和项目目录下的 TXT）按多个速度规划若干圈，
+统计加随机偏移后实际发送的位置序列在每个时间窗口内的速度，偏差超过容差时
+以退出码 1 结束。
+
+用法（在项目根目录）:
+    python tools/validate_speed.py
+    python tools/validate_speed.py --tolerance 0.01 --window 1 routes/HNroute.json
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SPEEDS = (2.5, 3.5, 4.2, 6.0)
+DT = 0.2
+
+
+def bundled_routes():
+    txt = [p for p in sorted(ROOT.glob("*.txt")) if p.name != "requirements.txt"]
+    return sorted(ROOT.glob("routes/*.json")) + txt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查轨迹规划的实际速度")
+    parser.add_argument("routes", nargs="*", help="路径文件，默认检查自带的全部路径")
+    parser.add_argument("--laps", type=int, default=5, help="每个速度规划的圈数（随机偏移不同）")
+    parser.add_argument("--window", type=float, default=1.0, help="统计窗口（秒）")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="允许的相对偏差")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    from run import planLap
+    from route_manager import RouteManager
+    from util.trajectory import speed_profile
+
+    manager = RouteManager(str(ROOT / "routes"))
+    window = max(1, int(round(args.window / DT)))
+    random.seed(args.seed)
+    failed = False
+    for route_file in args.routes or bundled_routes():
+        loc = manager.load_route_coordinates(str(route_file))
+        path = loc + [loc[0]]
+        print(f"{Path(route_file).name}（{len(loc)} 个点）")
+        for v in SPEEDS:
+            worst = 0.0
+            elapsed = 0.0
+            for _ in range(args.laps):
+                start = time.perf_counter()
+                _, ticks = planLap(path, v, DT)
+                elapsed += time.perf_counter() - start
+                report = speed_profile(ticks + [path[-1]], DT, target=v, window=window)
+                worst = max(worst, report["max_deviation"])
+            ok = worst <= args.tolerance
+            failed |= not ok
+            print(f"  {v:4.1f} m/s  最大偏差 {worst:6.2%}  规划耗时 {elapsed / args.laps * 1000:6.1f} ms/圈  "
+                  f"{'OK' if ok else 'FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+跑后分析
+
+读取会话日志（util/journal.py）或路径文件，统计实际配速、每圈距离和滑动窗口速度，
+并标出异常：瞬时速度过快（spike）、发送间隔过长（gap）和长时间几乎不动（stop）。
+
+数据按列保存（time, lat, lng, lap 各为一个序列），计算都是对整列的批量运算
+（map / operator / accumulate / 前缀和），不为每个点创建对象，几小时 20 Hz 的记录也能在一秒内完成。
+"""
+import csv
+import math
+from itertools import accumulate, compress, repeat
+from operator import gt, lt, ne, sub, truediv
+
+from util.geometry import EARTH_RADIUS
+
+
+def load_journal(path):
+    """
+    读取会话日志
+
+    Returns:
+        ({"time", "lat", "lng", "lap", "tick", "latency"} 列, dt)
+    """
+    from util.journal import Entry, JournalReader
+
+    with JournalReader(path) as reader:
+        return dict(zip(Entry._fields, reader.columns())), reader.dt
+
+
+def load_route(path, speed, dt, laps=1):
+    """
+    读取路径文件，按 speed 规划 laps 圈（与实际跑步相同的随机偏移），作为一次模拟会话分析
+
+    Returns:
+        (列, dt)，时间从 0 开始
+    """
+    from route_manager import RouteManager
+    from run import planLap
+
+    loc = RouteManager().load_route_coordinates(str(path))
+    points, lap_numbers = [], []
+    for lap in range(1, laps + 1):
+        ticks = planLap(loc + [loc[0]], speed, dt)[1]
+        points += ticks
+        lap_numbers += [lap] * len(ticks)
+    n = len(points)
+    return {
+        "time": [k * dt for k in range(n)],
+        "lat": [p["lat"] for p in points],
+        "lng": [p["lng"] for p in points],
+        "lap": lap_numbers,
+        "tick": list(range(n)),
+        "latency": [0.0] * n,
+    }, dt
+
+
+def _runs(indices):
+    """把有序下标合并为连续区间 [(起, 止), ...]（含两端）"""
+    runs = []
+    for i in indices:
+        if runs and i == runs[-1][1] + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+
+def analyze(columns, dt, window=5.0, max_speed=8.0, stop_speed=0.5, min_stop=3.0):
+    """
+    统计一次会话
+
+    Args:
+        columns: load_journal / load_route 返回的列
+        dt: 计划的发送间隔（秒）
+        window: 滑动窗口（秒）
+        max_speed: 相邻两点的瞬时速度超过该值（米/秒）视为 spike
+        stop_speed: 瞬时速度低于该值（米/秒）视为停下
+        min_stop: 停下持续超过该时长（秒）才报告
+
+    Returns:
+        {"summary", "laps", "anomalies", "step", "speed", "rolling"}
+        step/speed 为到达每个点的距离和瞬时速度（第一个点为 0），rolling 为以该点结尾的窗口速度
+    """
+    T, LAT, LNG, LAP = columns["time"], columns["lat"], columns["lng"], columns["lap"]
+    n = len(T)
+    if n < 2:
+        return {"summary": {"ticks": n, "duration": 0.0, "distance": 0.0, "mean": 0.0, "pace": None},
+                "laps": [], "anomalies": [], "step": [0.0] * n, "speed": [0.0] * n, "rolling": [0.0] * n}
+
+    # 整列运算都交给 map 和 operator 在 C 层完成，避免逐点的 Python 字节码
+    ky = math.pi / 180.0 * EARTH_RADIUS
+    kx = math.cos(math.radians(LAT[0])) * ky
+    X = [x * kx for x in LNG]
+    Y = [y * ky for y in LAT]
+    step = [0.0]
+    step += map(math.hypot, map(sub, X[1:], X), map(sub, Y[1:], Y))
+    gaps = [0.0]
+    gaps += map(sub, T[1:], T)
+    speed = [0.0]
+    if 0.0 in gaps[1:]:
+        speed += (s / g if g > 0 else 0.0 for s, g in zip(step[1:], gaps[1:]))
+    else:
+        speed += map(truediv, step[1:], gaps[1:])
+    D = list(accumulate(step))
+
+    # 以每个点结尾、长 w 个 tick 的窗口，开头不足 w 个点时从第一个点算起
+    w = min(max(1, int(round(window / dt))), n - 1)
+    rolling = [0.0] + [(D[i] - D[0]) / (T[i] - T[0]) if T[i] > T[0] else 0.0 for i in range(1, w)]
+    spans = list(map(sub, T[w:], T))
+    if 0.0 in spans:
+        rolling += ((d / t if t > 0 else 0.0) for d, t in zip(map(sub, D[w:], D), spans))
+    else:
+        rolling += map(truediv, map(sub, D[w:], D), spans)
+
+    duration = T[-1] - T[0]
+    mean = D[-1] / duration if duration > 0 else 0.0
+    summary = {
+        "ticks": n,
+        "duration": duration,
+        "distance": D[-1],
+        "mean": mean,
+        "pace": _pace(mean),
+        "max_speed": max(speed),
+        "max_gap": max(gaps),
+    }
+
+    # 圈号连续，每圈的距离和时长都算到下一圈的第一个点（最后一圈算到最后一个点）
+    bounds = [0, *compress(range(1, n), map(ne, LAP[1:], LAP)), n]
+    laps = []
+    for a, b in zip(bounds, bounds[1:]):
+        end = min(b, n - 1)
+        distance = D[end] - D[a]
+        lap_duration = T[end] - T[a]
+        inside = rolling[max(a, 1):b] or [0.0]
+        laps.append({
+            "lap": LAP[a],
+            "ticks": b - a,
+            "distance": distance,
+            "duration": lap_duration,
+            "mean": distance / lap_duration if lap_duration > 0 else 0.0,
+            "pace": _pace(distance / lap_duration) if lap_duration > 0 else None,
+            "min": min(inside),
+            "max": max(inside),
+        })
+
+    anomalies = []
+    for a, b in _runs(compress(range(n), map(gt, speed, repeat(max_speed)))):
+        anomalies.append({"kind": "spike", "start": T[a] - T[0], "end": T[b] - T[0],
+                          "value": max(speed[a:b + 1]), "lap": LAP[a]})
+    for a, b in _runs(compress(range(n), map(gt, gaps, repeat(1.5 * dt)))):
+        anomalies.append({"kind": "gap", "start": T[a - 1] - T[0], "end": T[b] - T[0],
+                          "value": max(gaps[a:b + 1]), "lap": LAP[a]})
+    # 停下按瞬时速度判断，持续 min_stop 秒以上才报告
+    for a, b in _runs(compress(range(1, n), map(lt, speed[1:], repeat(stop_speed)))):
+        if T[b] - T[a - 1] >= min_stop:
+            anomalies.append({"kind": "stop", "start": T[a - 1] - T[0], "end": T[b] - T[0],
+                              "value": max(speed[a:b + 1]), "lap": LAP[a]})
+    anomalies.sort(key=lambda x: x["start"])
+
+    return {"summary": summary, "laps": laps, "anomalies": anomalies,
+            "step": step, "speed": speed, "rolling": rolling}
+
+
+def _pace(speed):
+    """配速（秒/公里）"""
+    return 1000 / speed if speed > 0 else None
+
+
+def format_pace(pace):
+    if pace is None:
+        return "-"
+    return f"{int(pace // 60)}'{int(round(pace % 60)):02d}\""
+
+
+def write_csv(path, columns, result):
+    """逐点导出：time,lat,lng,lap,tick,latency_ms,step,speed,rolling_speed"""
+    T = columns["time"]
+    t0 = T[0] if T else 0.0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "lat", "lng", "lap", "tick", "latency_ms", "step", "speed", "rolling_speed"])
+        writer.writerows(zip(
+            (f"{t - t0:.3f}" for t in T),
+            (f"{x:.8f}" for x in columns["lat"]),
+            (f"{x:.8f}" for x in columns["lng"]),
+            columns["lap"],
+            columns["tick"],
+            (f"{x * 1000:.3f}" for x in columns["latency"]),
+            (f"{x:.3f}" for x in result["step"]),
+            (f"{x:.3f}" for x in result["speed"]),
+            (f"{x:.3f}" for x in result["rolling"]),
+        ))
+
+
+def write_laps_csv(path, result):
+    """每圈一行：lap,ticks,distance,duration,mean,pace,min,max"""
+    fields = ["lap", "ticks", "distance", "duration", "mean", "pace", "min", "max"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for lap in result["laps"]:
+            writer.writerow({k: f"{v:.3f}" if isinstance(v, float) else v for k, v in lap.items()})
@@ -0,0 +1,61 @@
+"""
+时钟
+
+发送循环通过时钟读取当前时刻、等待到下一个 tick 的截止时刻，而不是直接调用
+time 模块。RealClock 按真实时间等待；VirtualClock 的等待立即返回并把时间拨到
+截止时刻，用于在几秒内跑完一次完整的模拟（start.py --simulate）和测试。
+
+wall() 把时钟的时刻换算为 Unix 时间戳（以创建时钟时的真实时间为基准），
+会话日志等需要绝对时间的记录都用它，虚拟时钟下记录的时间间隔与发送节奏一致。
+"""
+import time
+
+
+class RealClock:
+    """真实时间（单调时钟）"""
+
+    def __init__(self):
+        self.epoch = time.time() - time.perf_counter()
+
+    def now(self):
+        return time.perf_counter()
+
+    def wall(self, t=None):
+        """t（默认当前时刻）对应的 Unix 时间戳"""
+        return self.epoch + (self.now() if t is None else t)
+
+    def sleep_until(self, deadline):
+        """先睡眠到临近截止时刻，再短暂自旋，兼顾 CPU 占用和发送精度"""
+        remaining = deadline - time.perf_counter()
+        if remaining > 0.002:
+            time.sleep(remaining - 0.002)
+        while time.perf_counter() < deadline:
+            pass
+
+    def sleep(self, seconds):
+        self.sleep_until(self.now() + seconds)
+
+
+class VirtualClock:
+    """虚拟时间，等待不耗费真实时间"""
+
+    def __init__(self, start=0.0):
+        self.time = float(start)
+        self.epoch = time.time() - self.time
+
+    def now(self):
+        return self.time
+
+    def wall(self, t=None):
+        """t（默认当前时刻）对应的 Unix 时间戳"""
+        return self.epoch + (self.now() if t is None else t)
+
+    def sleep_until(self, deadline):
+        if deadline > self.time:
+            self.time = deadline
+
+    def sleep(self, seconds):
+        self.time += max(0.0, seconds)
+
+
+REAL_CLOCK = RealClock()
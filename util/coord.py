@@ -0,0 +1,75 @@
+"""
+坐标系转换
+
+百度取点使用 BD-09 坐标系，GPS 设备、GPX/KML/GeoJSON 文件以及 iOS 使用 WGS-84 坐标系
+"""
+import math
+
+x_pi = 3.14159265358979324 * 3000.0 / 180.0
+pi = 3.141592653589793238462643383  # π
+a = 6378245.0  # 长半轴
+ee = 0.00669342162296594323  # 偏心率平方
+
+
+def _transform_lat(x, y):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(y * pi) + 40.0 * math.sin(y / 3.0 * pi)) * 2.0 / 3.0
+    ret += (160.0 * math.sin(y / 12.0 * pi) + 320 * math.sin(y * pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lon(x, y):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * pi) + 20.0 * math.sin(2.0 * x * pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(x * pi) + 40.0 * math.sin(x / 3.0 * pi)) * 2.0 / 3.0
+    ret += (150.0 * math.sin(x / 12.0 * pi) + 300.0 * math.sin(x / 30.0 * pi)) * 2.0 / 3.0
+    return ret
+
+
+def _gcj_offset(lat, lng):
+    """WGS-84 与 GCJ-02 在 (lat, lng) 附近的偏移量"""
+    d_lat = _transform_lat(lng - 105.0, lat - 35.0)
+    d_lng = _transform_lon(lng - 105.0, lat - 35.0)
+
+    rad_lat = lat / 180.0 * pi
+    magic = math.sin(rad_lat)
+    magic = 1 - ee * magic * magic
+    sqrt_magic = math.sqrt(magic)
+
+    d_lng = (d_lng * 180.0) / (a / sqrt_magic * math.cos(rad_lat) * pi)
+    d_lat = (d_lat * 180.0) / (a * (1 - ee) / (magic * sqrt_magic) * pi)
+    return d_lat, d_lng
+
+
+def bd09Towgs84(position):
+    wgs_p = {}
+
+    x = position['lng'] - 0.0065
+    y = position['lat'] - 0.006
+    z = math.sqrt(x * x + y * y) - 0.00002 * math.sin(y * x_pi)
+    theta = math.atan2(y, x) - 0.000003 * math.cos(x * x_pi)
+
+    gcj_lng = z * math.cos(theta)
+    gcj_lat = z * math.sin(theta)
+
+    d_lat, d_lng = _gcj_offset(gcj_lat, gcj_lng)
+
+    wgs_p["lat"] = gcj_lat * 2 - gcj_lat - d_lat
+    wgs_p["lng"] = gcj_lng * 2 - gcj_lng - d_lng
+    return wgs_p
+
+
+def wgs84Tobd09(position):
+    bd_p = {}
+
+    d_lat, d_lng = _gcj_offset(position['lat'], position['lng'])
+    gcj_lat = position['lat'] + d_lat
+    gcj_lng = position['lng'] + d_lng
+
+    z = math.sqrt(gcj_lng * gcj_lng + gcj_lat * gcj_lat) + 0.00002 * math.sin(gcj_lat * x_pi)
+    theta = math.atan2(gcj_lat, gcj_lng) + 0.000003 * math.cos(gcj_lng * x_pi)
+
+    bd_p["lat"] = z * math.sin(theta) + 0.006
+    bd_p["lng"] = z * math.cos(theta) + 0.0065
+    return bd_p
@@ -0,0 +1,154 @@
+"""
+结构化事件日志
+
+发送循环所在的线程只把 LogRecord 放进队列，格式化（JSON 序列化）和写文件/终端都由
+QueueListener 的后台线程完成，打开 DEBUG 也不会拖慢发送节奏：
+
+    listener = eventlog.start([eventlog.file_handler("logs/events.jsonl")], logging.DEBUG)
+    log = logging.getLogger("iosrealrun.engine")
+    eventlog.event(log, "lap", lap=3, mean=4.18)
+    eventlog.event(log, "tick", logging.DEBUG, lap=3, tick=120, late=0.0004)
+    ...
+    listener.stop()
+
+每条记录写成一行 JSON：{"time", "level", "logger", "event", "message", 其余字段...}，
+普通的 logger.info("...") 的 event 为 "log"。由 event() 记录的 DEBUG 及以下的事件按
+(logger, event) 限速（令牌桶），被丢弃的条数记在下一条通过的记录的 suppressed 字段里；
+普通日志（包括第三方库的 DEBUG 日志）不限速。
+"""
+import os
+import json
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# DEBUG 事件的限速：每个事件每秒最多 DEBUG_RATE 条，允许连续 DEBUG_BURST 条
+DEBUG_RATE = 2.0
+DEBUG_BURST = 10
+# 事件日志写满后轮换为 .1、.2……，最多保留 BACKUP_COUNT 个旧文件
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+
+
+def event(logger, name, level=logging.INFO, message=None, **fields):
+    """
+    记录一个结构化事件
+
+    message 为终端等普通 handler 显示的文字，省略时显示事件名。
+    未启用 level 时只多一次 isEnabledFor 判断，不创建 LogRecord。
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, name if message is None else message, extra={"event": name, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """把 LogRecord 格式化为一行 JSON"""
+
+    def format(self, record):
+        data = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", "log"),
+        }
+        fields = getattr(record, "fields", None)
+        if fields is None or record.msg != data["event"]:
+            data["message"] = record.getMessage()
+        if fields is not None:
+            data.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """按 (logger, event) 对 level 及以下的结构化事件限速，更高级别的事件和普通日志总是通过"""
+
+    def __init__(self, rate=DEBUG_RATE, burst=DEBUG_BURST, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.level = level
+        # key -> [剩余令牌, 上次的时刻, 被丢弃的条数]
+        self.buckets = {}
+
+    def filter(self, record):
+        name = getattr(record, "event", None)
+        if name is None or record.levelno > self.level:
+            return True
+        key = (record.name, name)
+        now = record.created
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now, 0]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """
+    原样放入队列
+
+    标准的 QueueHandler.prepare 会在调用线程里格式化消息（为了能跨进程 pickle），
+    这里队列只在本进程内使用，格式化留给后台线程。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def file_handler(path, level=logging.NOTSET, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """
+    以 JSON 行格式追加写入 path 的 handler，超过 max_bytes 时轮换
+
+    Returns:
+        RotatingFileHandler；path 为空时返回 None（不记录）
+    """
+    if not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(level)
+    return handler
+
+
+def start(handlers, level=logging.INFO, rate=DEBUG_RATE, burst=DEBUG_BURST):
+    """
+    让 root logger 经队列输出到 handlers
+
+    原有的 root handler 会被移除，需要保留的（例如 coloredlogs 的终端输出）一并放进 handlers。
+
+    Args:
+        handlers: 后台线程中使用的 handler，None 会被忽略
+        level: root logger 的级别
+        rate, burst: DEBUG 事件的限速，见 RateLimitFilter
+
+    Returns:
+        已启动的 QueueListener，退出前调用 stop() 写完剩余的记录
+    """
+    root = logging.getLogger()
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(RateLimitFilter(rate, burst))
+    listener = QueueListener(records, *(h for h in handlers if h is not None), respect_handler_level=True)
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    return listener
@@ -0,0 +1,57 @@
+"""
+不连接手机的定位设备
+
+接口与 pymobiledevice3 的 LocationSimulation 相同（set / clear）：
+RecordingLocation 把每次设置的位置连同时钟时刻写入文件，用于 --simulate 模式和测试；
+UdpLocation 把位置发给本机的假端点，用于压力测试（tools/loadtest.py）。
+"""
+import socket
+import struct
+import time
+
+# 会话编号, tick 序号, 发送时刻 (perf_counter), lat, lng
+PACKET = struct.Struct("<IIddd")
+
+
+class RecordingLocation:
+    """把发送的位置按 CSV（time,lat,lng,lap）写入文件"""
+
+    def __init__(self, file, clock):
+        """
+        Args:
+            file: 以文本方式打开的文件
+            clock: 提供 now() 的时钟，时刻从创建时算起
+        """
+        self.file = file
+        self.clock = clock
+        self.start = clock.now()
+        self.lap = 0
+        self.count = 0
+        file.write("time,lat,lng,lap\n")
+
+    def set(self, latitude, longitude):
+        self.file.write(f"{self.clock.now() - self.start:.3f},{latitude:.8f},{longitude:.8f},{self.lap}\n")
+        self.count += 1
+
+    def clear(self):
+        pass
+
+
+class UdpLocation:
+    """每次设置位置时向 address 发送一个 UDP 包，格式见 PACKET"""
+
+    def __init__(self, address, session):
+        self.address = address
+        self.session = session
+        self.tick = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def set(self, latitude, longitude):
+        self.sock.sendto(PACKET.pack(self.session, self.tick, time.perf_counter(), latitude, longitude), self.address)
+        self.tick += 1
+
+    def clear(self):
+        pass
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,240 @@
+"""
+GPX / KML / GeoJSON 路径读写
+
+读取时使用 iterparse 逐个元素解析并及时释放，几十兆的轨迹文件也只占用
+与坐标点数量成正比的内存。文件中的坐标为 WGS-84，读入后转换为路径使用的
+BD-09 坐标；写出时反向转换。
+"""
+import json
+import math
+from datetime import datetime, timezone
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+from util.coord import bd09Towgs84, wgs84Tobd09
+
+TRACK_EXTENSIONS = (".gpx", ".kml", ".geojson")
+
+
+def _local(tag):
+    """去掉 XML 命名空间前缀"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_time(text):
+    """ISO 8601 时间转换为 Unix 时间戳，无法解析时返回 None"""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _point(lat, lng, t=None):
+    p = wgs84Tobd09({"lat": float(lat), "lng": float(lng)})
+    if t is not None:
+        p["time"] = t
+    return p
+
+
+def _iter_elements(file_path, tags):
+    """
+    流式遍历 XML，在指定标签的元素结束时生成 (标签, 元素)
+
+    处理完的元素会从父节点上摘除，已解析的部分不会在内存中累积。
+    """
+    stack = []
+    for event, elem in iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        tag = _local(elem.tag)
+        if tag in tags:
+            yield tag, elem
+            if stack:
+                stack[-1].remove(elem)
+
+
+def iter_gpx(file_path):
+    """
+    逐条读取 GPX 中的轨迹段（trkseg）和路线（rte）
+
+    Yields:
+        一条折线的坐标列表 [{"lat", "lng"[, "time"]}, ...]，time 为 Unix 时间戳
+    """
+    for tag, elem in _iter_elements(file_path, ("trkseg", "rte")):
+        line = []
+        for pt in elem:
+            if _local(pt.tag) not in ("trkpt", "rtept"):
+                continue
+            t = None
+            for child in pt:
+                if _local(child.tag) == "time":
+                    t = _parse_time(child.text)
+            line.append(_point(pt.get("lat"), pt.get("lon"), t))
+        yield line
+
+
+def iter_kml(file_path):
+    """
+    逐条读取 KML 中的 LineString / LinearRing 以及 gx:Track 轨迹，Point 不读取
+
+    Yields:
+        一条折线的坐标列表 [{"lat", "lng"[, "time"]}, ...]
+    """
+    for tag, elem in _iter_elements(file_path, ("LineString", "LinearRing", "Track")):
+        if tag == "Track":
+            # gx:coord 为 "lng lat alt"，与 <when> 按顺序一一对应
+            whens = [_parse_time(c.text) for c in elem if _local(c.tag) == "when"]
+            coords = [(c.text or "").split() for c in elem if _local(c.tag) == "coord"]
+            yield [
+                _point(values[1], values[0], whens[k] if k < len(whens) else None)
+                for k, values in enumerate(coords) if len(values) >= 2
+            ]
+            continue
+        line = []
+        for child in elem:
+            if _local(child.tag) != "coordinates":
+                continue
+            for item in (child.text or "").split():
+                values = item.split(",")
+                if len(values) >= 2:
+                    line.append(_point(values[1], values[0]))
+        yield line
+
+
+def iter_geojson(file_path):
+    """
+    逐条读取 GeoJSON 中的 LineString / MultiLineString 的各段 / Polygon 的外环，Point 不读取
+
+    标准库没有流式 JSON 解析器，这里整体读取后逐个几何对象生成折线；
+    GeoJSON 没有 DOM 开销，内存仍与坐标点数量成正比。
+
+    Yields:
+        一条折线的坐标列表 [{"lat", "lng"}, ...]
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    def geometries(obj):
+        kind = obj.get("type")
+        if kind == "FeatureCollection":
+            for feature in obj.get("features", []):
+                yield from geometries(feature)
+        elif kind == "Feature":
+            if obj.get("geometry"):
+                yield from geometries(obj["geometry"])
+        elif kind == "GeometryCollection":
+            for geometry in obj.get("geometries", []):
+                yield from geometries(geometry)
+        else:
+            yield obj
+
+    for geometry in geometries(data):
+        kind = geometry.get("type")
+        coordinates = geometry.get("coordinates") or []
+        if kind == "LineString":
+            lines = [coordinates]
+        elif kind == "MultiLineString":
+            lines = coordinates
+        elif kind == "Polygon":
+            lines = coordinates[:1]
+        elif kind == "MultiPolygon":
+            lines = [polygon[0] for polygon in coordinates if polygon]
+        else:
+            continue
+        for line in lines:
+            yield [_point(c[1], c[0]) for c in line]
+
+
+TRACK_READERS = {
+    ".gpx": iter_gpx,
+    ".kml": iter_kml,
+    ".geojson": iter_geojson,
+}
+
+
+def _line_length(line):
+    """折线的近似长度（度，经度按纬度缩放），只用于比较"""
+    total = 0.0
+    for a, b in zip(line, line[1:]):
+        total += math.hypot((b["lng"] - a["lng"]) * math.cos(math.radians(a["lat"])), b["lat"] - a["lat"])
+    return total
+
+
+def load_track(file_path, keep_time=False):
+    """
+    读取轨迹文件
+
+    三种格式按同一规则处理：文件中的各条折线（GPX 的 trkseg/rte、KML 的 LineString/
+    LinearRing/gx:Track、GeoJSON 的 LineString 各段和 Polygon 外环）不首尾拼接，
+    否则条与条之间会多出一段并不存在的连线，只取其中最长的一条；单独的点（起终点标记等）忽略。
+
+    Args:
+        file_path: .gpx / .kml / .geojson 文件
+        keep_time: 是否保留时间戳
+
+    Returns:
+        坐标列表（BD-09）；文件中没有折线时为空列表
+    """
+    suffix = "." + str(file_path).rsplit(".", 1)[-1].lower()
+    if suffix not in TRACK_READERS:
+        raise ValueError(f"不支持的轨迹格式: {suffix}")
+    points = max(TRACK_READERS[suffix](file_path), key=_line_length, default=[])
+    if not keep_time:
+        for p in points:
+            p.pop("time", None)
+    return points
+
+
+def _wgs84(points):
+    for p in points:
+        yield p, bd09Towgs84(p)
+
+
+def _format_time(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def write_gpx(file_path, points, name=""):
+    """逐点写出 GPX 轨迹"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<gpx version="1.1" creator="iOSRealRun" xmlns="http://www.topografix.com/GPX/1/1">\n')
+        f.write(f'  <trk>\n    <name>{escape(name)}</name>\n    <trkseg>\n')
+        for p, w in _wgs84(points):
+            if "time" in p:
+                f.write(f'      <trkpt lat="{w["lat"]}" lon="{w["lng"]}"><time>{_format_time(p["time"])}</time></trkpt>\n')
+            else:
+                f.write(f'      <trkpt lat="{w["lat"]}" lon="{w["lng"]}"/>\n')
+        f.write('    </trkseg>\n  </trk>\n</gpx>\n')
+
+
+def write_kml(file_path, points, name=""):
+    """逐点写出 KML LineString"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<kml xmlns="http://www.opengis.net/kml/2.2">\n  <Document>\n')
+        f.write(f'    <Placemark>\n      <name>{escape(name)}</name>\n      <LineString>\n        <coordinates>\n')
+        for p, w in _wgs84(points):
+            f.write(f'          {w["lng"]},{w["lat"]}\n')
+        f.write('        </coordinates>\n      </LineString>\n    </Placemark>\n  </Document>\n</kml>\n')
+
+
+def write_geojson(file_path, points, name=""):
+    """逐点写出 GeoJSON LineString Feature"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('{"type": "Feature", "properties": {"name": %s}, ' % json.dumps(name, ensure_ascii=False))
+        f.write('"geometry": {"type": "LineString", "coordinates": [')
+        for i, (p, w) in enumerate(_wgs84(points)):
+            f.write(("," if i else "") + f'\n  [{w["lng"]}, {w["lat"]}]')
+        f.write('\n]}}\n')
+
+
+TRACK_WRITERS = {
+    "gpx": write_gpx,
+    "kml": write_kml,
+    "geojson": write_geojson,
+}
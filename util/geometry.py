@@ -0,0 +1,190 @@
+"""
+路径几何工具
+
+坐标均为 {"lat": float, "lng": float}。为了速度，距离计算在路径中心附近
+使用等距圆柱投影换算成米，对校园尺度（几公里以内）的路径误差可以忽略。
+"""
+import math
+import heapq
+
+EARTH_RADIUS = 6371008.8  # 平均地球半径（米）
+
+
+def project(coordinates, origin=None):
+    """
+    将经纬度投影为以 origin 为原点的平面坐标（米）
+
+    Args:
+        coordinates: 坐标列表
+        origin: 投影原点 {"lat", "lng"}，默认取第一个点
+
+    Returns:
+        [(x, y), ...]
+    """
+    if not coordinates:
+        return []
+    if origin is None:
+        origin = coordinates[0]
+    lat0 = math.radians(origin["lat"])
+    kx = math.cos(lat0) * math.pi / 180.0 * EARTH_RADIUS
+    ky = math.pi / 180.0 * EARTH_RADIUS
+    lng0 = origin["lng"]
+    lat0 = origin["lat"]
+    return [((p["lng"] - lng0) * kx, (p["lat"] - lat0) * ky) for p in coordinates]
+
+
+def planar_distance(p1, p2):
+    """两点间的近似距离（米）"""
+    (x1, y1), (x2, y2) = project([p1, p2], origin=p1)
+    return math.hypot(x2 - x1, y2 - y1)
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    """点到线段的距离"""
+    dx = bx - ax
+    dy = by - ay
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return math.hypot(px - ax, py - ay)
+    t = ((px - ax) * dx + (py - ay) * dy) / length2
+    t = max(0.0, min(1.0, t))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify_douglas_peucker(coordinates, tolerance):
+    """
+    Douglas–Peucker 简化
+
+    保证被删除的点到简化后折线的距离不超过 tolerance 米。使用显式栈，
+    长路径不会触发递归深度限制。
+
+    Args:
+        coordinates: 坐标列表
+        tolerance: 允许的最大偏差（米）
+
+    Returns:
+        简化后的坐标列表（原坐标对象的浅拷贝）
+    """
+    n = len(coordinates)
+    if n < 3 or tolerance <= 0:
+        return [p.copy() for p in coordinates]
+
+    xy = project(coordinates)
+    keep = [False] * n
+    keep[0] = keep[n - 1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = xy[start]
+        bx, by = xy[end]
+        max_dist = -1.0
+        index = -1
+        for i in range(start + 1, end):
+            dist = _segment_distance(xy[i][0], xy[i][1], ax, ay, bx, by)
+            if dist > max_dist:
+                max_dist = dist
+                index = i
+        if index != -1 and max_dist > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [coordinates[i].copy() for i in range(n) if keep[i]]
+
+
+def _triangle_area(a, b, c):
+    return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2.0
+
+
+def simplify_visvalingam(coordinates, tolerance):
+    """
+    Visvalingam–Whyatt 简化
+
+    依次删除有效面积最小的点，直到最小面积超过 tolerance² 平方米，
+    相比 Douglas–Peucker 更能保留弯道的整体形状。面积小不代表偏差小（底边很短时
+    三角形可以很高），因此删除前还要检查：该点两侧保留的点之间所有原始点到新线段的
+    距离都不超过 tolerance，否则保留该点。与 Douglas–Peucker 一样保证偏差不超过 tolerance。
+
+    Args:
+        coordinates: 坐标列表
+        tolerance: 允许的最大偏差（米），面积阈值为 tolerance 的平方
+
+    Returns:
+        简化后的坐标列表
+    """
+    n = len(coordinates)
+    if n < 3 or tolerance <= 0:
+        return [p.copy() for p in coordinates]
+
+    threshold = tolerance * tolerance
+    xy = project(coordinates)
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = [False] * n
+    areas = [math.inf] * n
+
+    heap = []
+    for i in range(1, n - 1):
+        areas[i] = _triangle_area(xy[i - 1], xy[i], xy[i + 1])
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue  # 过期的堆元素
+        if area > threshold:
+            break
+        p, q = prev[i], nxt[i]
+        (ax, ay), (bx, by) = xy[p], xy[q]
+        if any(_segment_distance(xy[k][0], xy[k][1], ax, ay, bx, by) > tolerance for k in range(p + 1, q)):
+            # 暂时保留，相邻的点被删除后会重新计算面积再尝试
+            areas[i] = math.inf
+            continue
+        removed[i] = True
+        nxt[p] = q
+        prev[q] = p
+        # 更新相邻点的面积，保证面积单调不减
+        for j in (p, q):
+            if 0 < j < n - 1:
+                new_area = max(area, _triangle_area(xy[prev[j]], xy[j], xy[nxt[j]]))
+                areas[j] = new_area
+                heapq.heappush(heap, (new_area, j))
+
+    return [coordinates[i].copy() for i in range(n) if not removed[i]]
+
+
+SIMPLIFY_METHODS = {
+    "dp": simplify_douglas_peucker,
+    "vw": simplify_visvalingam,
+}
+
+
+def nearest_point_on_route(coordinates, point):
+    """
+    求折线上距离 point 最近的点
+
+    Args:
+        coordinates: 坐标列表（按开放折线处理）
+        point: {"lat", "lng"}
+
+    Returns:
+        (最近点 {"lat", "lng"}, 所在线段起点的下标)
+    """
+    if len(coordinates) == 1:
+        return coordinates[0].copy(), 0
+    xy = project(coordinates, origin=point)
+    best = (math.inf, 0, 0.0)
+    for i in range(len(xy) - 1):
+        ax, ay = xy[i]
+        bx, by = xy[i + 1]
+        d = _segment_distance(0.0, 0.0, ax, ay, bx, by)
+        if d < best[0]:
+            dx = bx - ax
+            dy = by - ay
+            length2 = dx * dx + dy * dy
+            t = 0.0 if length2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length2))
+            best = (d, i, t)
+    _, i, t = best
+    a, b = coordinates[i], coordinates[i + 1]
+    return {"lat": a["lat"] + t * (b["lat"] - a["lat"]), "lng": a["lng"] + t * (b["lng"] - a["lng"])}, i
@@ -0,0 +1,184 @@
+"""
+会话日志
+
+以紧凑的二进制格式只追加地记录每个实际发送的位置，用于跑完后核对和排查被判无效的记录。
+
+文件格式（小端）：
+
+    头部  magic(4s) version(H) 记录长度(H) dt(d)
+    记录  时刻(d, Unix 时间) lat(d) lng(d) 圈(I) tick(I) 发送耗时(f, 秒)
+
+lat/lng 为发给设备的 WGS-84 坐标。发送循环只把记录放进队列，打包和写文件由后台线程
+批量完成，不会阻塞发送；程序异常退出时最多丢失最后一个批次，末尾不完整的记录读取时忽略。
+"""
+import os
+import mmap
+import time
+import struct
+import threading
+from collections import deque, namedtuple
+
+MAGIC = b"IRRJ"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<dddIIf")
+SUFFIX = ".irj"
+
+Entry = namedtuple("Entry", "time lat lng lap tick latency")
+
+
+class JournalWriter:
+    """在后台线程中批量写入记录"""
+
+    def __init__(self, path, dt, flush_interval=1.0, buffer_size=1 << 16):
+        """
+        Args:
+            path: 日志文件路径，已存在时追加
+            dt: 发送间隔（秒），写入头部供分析使用
+            flush_interval: 后台线程写入的间隔（秒）
+            buffer_size: 文件缓冲区大小（字节）
+        """
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        if exists:
+            _check_header(self.path)
+            # 上次异常退出时留下的不完整记录截掉，保证追加的记录对齐
+            size = os.path.getsize(self.path)
+            partial = (size - HEADER.size) % RECORD.size
+            if partial:
+                os.truncate(self.path, size - partial)
+        self.file = open(self.path, "ab", buffering=buffer_size)
+        if not exists:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, dt))
+        # deque 的 append/popleft 是线程安全的，发送循环不需要加锁
+        self.pending = deque()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._writer, name="journal-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, lap, tick, lat, lng, latency, timestamp=None):
+        """记录一个已发送的位置（在发送循环中调用）"""
+        self.pending.append((time.time() if timestamp is None else timestamp, lat, lng, lap, tick, latency))
+
+    def _drain(self):
+        pending = self.pending
+        if not pending:
+            return
+        records = []
+        while pending:
+            records.append(RECORD.pack(*pending.popleft()))
+        self.file.write(b"".join(records))
+        self.file.flush()
+
+    def _writer(self):
+        while not self.closed.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        """写入剩余的记录并关闭文件"""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.thread.join()
+        self._drain()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _check_header(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} 不是会话日志")
+    magic, version, size, dt = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise ValueError(f"{path} 不是会话日志或版本不兼容")
+    return dt
+
+
+def open_session(directory, dt, prefix="session"):
+    """
+    在 directory 下按开始时间创建新的会话日志
+
+    Returns:
+        JournalWriter；directory 为空时返回 None（不记录）
+    """
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    name = f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}"
+    path = os.path.join(directory, name + SUFFIX)
+    k = 1
+    while os.path.exists(path):
+        k += 1
+        path = os.path.join(directory, f"{name}-{k}{SUFFIX}")
+    return JournalWriter(path, dt)
+
+
+class JournalReader:
+    """以内存映射方式读取会话日志，支持 len、下标和迭代"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.dt = _check_header(self.path)
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = (len(self.map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return Entry(*RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size))
+
+    def __iter__(self):
+        view = memoryview(self.map)[HEADER.size:HEADER.size + self.count * RECORD.size]
+        try:
+            for values in RECORD.iter_unpack(view):
+                yield Entry(*values)
+        finally:
+            view.release()
+
+    def columns(self, chunk=4096):
+        """
+        按列一次性解包全部记录
+
+        每次用重复的格式解包 chunk 条记录，再按步长切片取出各列，比逐条解包快约 3 倍。
+
+        Returns:
+            与 Entry 字段对应的 6 个列表
+        """
+        fields = len(Entry._fields)
+        columns = [[] for _ in range(fields)]
+        block = struct.Struct("<" + RECORD.format[1:] * chunk)
+        offset = HEADER.size
+        left = self.count
+        while left:
+            if left < chunk:
+                block = struct.Struct("<" + RECORD.format[1:] * left)
+            flat = block.unpack_from(self.map, offset)
+            for j in range(fields):
+                columns[j] += flat[j::fields]
+            offset += block.size
+            left -= block.size // RECORD.size
+        return columns
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,190 @@
+"""
+配速方案
+
+一次跑步描述为若干阶段，例如：
+
+    wobble: 0.03            # 可选，速度在 ±3% 内平滑起伏
+    phases:
+      - {type: warmup, duration: 300, from: 2.5, to: 3.5}
+      - {type: steady, duration: 600, speed: 4.0}
+      - {type: interval, repeats: 4, fast: 5.0, slow: 3.0, fast_duration: 60, slow_duration: 90}
+      - {type: cooldown, duration: 300, to: 2.5}
+
+各阶段先展开为 (时刻, 速度) 关键帧，关键帧之间用余弦曲线平滑过渡。开始跑步前
+把整个方案一次性编译成逐圈的位置表，发送循环只需要按下标取点。方案结束后按
+最后的速度继续匀速跑。
+"""
+import math
+import random
+from bisect import bisect_right
+
+PHASE_TYPES = ("warmup", "steady", "interval", "cooldown")
+
+
+def _number(phase, key, default=None):
+    value = phase.get(key, default)
+    if value is None:
+        raise ValueError(f"{phase.get('type')} 阶段缺少 {key}")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f"{phase.get('type')} 阶段的 {key} 必须为正数: {value!r}")
+    return float(value)
+
+
+def _duration(phase, prefix, speed):
+    """阶段（或其中一段）的时长，也可以用距离指定"""
+    if phase.get(prefix + "distance") is not None:
+        return _number(phase, prefix + "distance") / speed
+    return _number(phase, prefix + "duration")
+
+
+class PaceProfile:
+    """由阶段列表展开的速度曲线 v(t)"""
+
+    def __init__(self, phases, default_speed, ramp=5.0, wobble=0.0, seed=None):
+        """
+        Args:
+            phases: 阶段列表
+            default_speed: 阶段中省略速度时使用的速度（米/秒）
+            ramp: 相邻阶段速度不同时的过渡时长（秒）
+            wobble: 速度随机起伏的幅度（比例）
+            seed: 随机起伏的种子
+        """
+        if not phases:
+            raise ValueError("配速方案至少需要一个阶段")
+        self.default_speed = float(default_speed)
+        self.ramp = float(ramp)
+        self.wobble = float(wobble)
+        rng = random.Random(seed)
+        self.wobble_phases = (rng.uniform(0, 2 * math.pi), rng.uniform(0, 2 * math.pi))
+        self.phases = list(phases)
+        self.times = []
+        self.speeds = []
+        self._build()
+
+    @classmethod
+    def load(cls, spec, default_speed, seed=None):
+        """
+        从配置创建配速方案
+
+        Args:
+            spec: 阶段列表、{"phases": [...], "ramp", "wobble"} 字典，
+                  或者包含上述内容的 YAML/JSON 文件路径
+            default_speed: 默认速度
+        """
+        if isinstance(spec, str):
+            with open(spec, 'r', encoding='utf-8') as f:
+                if spec.endswith('.json'):
+                    import json
+                    spec = json.load(f)
+                else:
+                    import yaml
+                    spec = yaml.safe_load(f)
+        if isinstance(spec, list):
+            spec = {"phases": spec}
+        if not isinstance(spec, dict):
+            raise ValueError("配速方案格式错误")
+        return cls(
+            spec.get("phases") or [], default_speed,
+            ramp=spec.get("ramp", 5.0), wobble=spec.get("wobble", 0.0), seed=seed
+        )
+
+    def _key(self, duration, speed):
+        """在当前末尾之后 duration 秒处加一个关键帧"""
+        self.times.append(self.times[-1] + duration)
+        self.speeds.append(speed)
+
+    def _hold(self, speed, duration):
+        """先过渡到 speed，再保持到 duration 结束"""
+        ramp = min(self.ramp, duration / 2) if speed != self.speeds[-1] else 0.0
+        if ramp:
+            self._key(ramp, speed)
+        self._key(duration - ramp, speed)
+
+    def _build(self):
+        for phase in self.phases:
+            kind = phase.get("type")
+            if kind not in PHASE_TYPES:
+                raise ValueError(f"未知的阶段类型: {kind}，可选 {', '.join(PHASE_TYPES)}")
+            if kind in ("warmup", "cooldown"):
+                # 热身默认从 70% 的速度开始加速到默认速度，放松默认从当前速度减到 70%
+                start = _number(phase, "from", self.speeds[-1] if self.speeds else self.default_speed * 0.7)
+                end = _number(phase, "to", self.default_speed if kind == "warmup" else self.default_speed * 0.7)
+                if not self.times:
+                    self.times.append(0.0)
+                    self.speeds.append(start)
+                elif start != self.speeds[-1]:
+                    self._key(min(self.ramp, 1.0), start)
+                self._key(_duration(phase, "", (start + end) / 2), end)
+                continue
+
+            if not self.times:
+                self.times.append(0.0)
+                self.speeds.append(_number(phase, "speed", self.default_speed) if kind == "steady"
+                                   else _number(phase, "fast"))
+            if kind == "steady":
+                speed = _number(phase, "speed", self.default_speed)
+                self._hold(speed, _duration(phase, "", speed))
+            else:
+                fast = _number(phase, "fast")
+                slow = _number(phase, "slow", self.default_speed)
+                repeats = int(_number(phase, "repeats", 1))
+                for _ in range(repeats):
+                    self._hold(fast, _duration(phase, "fast_", fast))
+                    self._hold(slow, _duration(phase, "slow_", slow))
+
+    @property
+    def duration(self):
+        return self.times[-1]
+
+    @property
+    def final_speed(self):
+        return self.speeds[-1]
+
+    def speed(self, t):
+        """t 秒时的速度（米/秒）"""
+        i = bisect_right(self.times, t)
+        if i >= len(self.times):
+            v = self.speeds[-1]
+        elif i == 0:
+            v = self.speeds[0]
+        else:
+            t0, t1 = self.times[i - 1], self.times[i]
+            v0, v1 = self.speeds[i - 1], self.speeds[i]
+            u = (t - t0) / (t1 - t0)
+            v = v0 + (v1 - v0) * (1 - math.cos(math.pi * u)) / 2
+        if self.wobble:
+            p1, p2 = self.wobble_phases
+            v *= 1 + self.wobble * (0.6 * math.sin(2 * math.pi * t / 97 + p1) + 0.4 * math.sin(2 * math.pi * t / 41 + p2))
+        return v
+
+    def compile(self, path, dt, plan, max_laps=1000):
+        """
+        把整个方案编译为逐圈的位置表
+
+        Args:
+            path: 一圈的开放折线（终点与起点相同）
+            dt: 发送间隔（秒）
+            plan: plan(path, speed, dt) -> (未加偏移的位置序列, 实际发送的位置序列)，
+                  speed 为按 tick 序号返回速度的函数
+            max_laps: 最多编译的圈数
+
+        Returns:
+            [(base, ticks), ...]，覆盖方案的全部时长
+
+        Raises:
+            ValueError: max_laps 圈还跑不完整个方案（路径太短或方案太长）
+        """
+        tables = []
+        t = 0.0
+        while t < self.duration:
+            if len(tables) >= max_laps:
+                raise ValueError(
+                    f"配速方案时长 {self.duration / 60:.1f} 分钟，{max_laps} 圈只覆盖了前 {t / 60:.1f} 分钟，"
+                    f"请缩短方案或使用更长的路径"
+                )
+            base, ticks = plan(path, lambda k, t0=t: self.speed(t0 + k * dt), dt)
+            if not ticks:
+                break
+            tables.append((base, ticks))
+            t += len(ticks) * dt
+        return tables
@@ -0,0 +1,128 @@
+"""
+启动阶段计时与性能分析
+
+    timer = PhaseTimer(log)
+    with timer.phase("初始化"):
+        init.init()
+    ...
+    log(timer.summary())
+
+设置环境变量 IOSREALRUN_PROFILE（start.py --profile DIR）后，每个阶段还会在
+cProfile 和 tracemalloc 下运行，结束时在 DIR 下按本次会话开始时间命名的子目录中写入：
+
+    NN-阶段.prof   cProfile 原始数据，可用 snakeviz 等工具查看
+    NN-阶段.txt    按累计耗时排序的函数、该阶段新增内存最多的代码行和内存峰值
+
+工作在其他进程中完成的阶段（例如启动隧道）用 phase(name, profile=False) 只计时。
+
+未设置时每个阶段只多两次 perf_counter 调用。环境变量会被引擎进程继承，
+GUI、命令行和守护模式都可以使用。cProfile 只统计执行阶段的线程。
+"""
+import io
+import os
+import re
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = "IOSREALRUN_PROFILE"
+
+
+class PhaseTimer:
+    """记录各阶段的耗时，每个阶段结束时通过 log 输出一行"""
+
+    def __init__(self, log=print, profile_dir=None):
+        """
+        Args:
+            log: 输出函数
+            profile_dir: 性能分析报告的目录，默认读取环境变量 IOSREALRUN_PROFILE，为空时不分析
+        """
+        self.log = log
+        self.phases = []
+        self.profile_dir = profile_dir if profile_dir is not None else os.environ.get(PROFILE_ENV)
+        # 每个 PhaseTimer（一次会话）的报告写入单独的子目录，第一次写入时创建
+        self.session_dir = None
+        self.session_name = time.strftime("%Y%m%d-%H%M%S")
+
+    @contextmanager
+    def phase(self, name, profile=True):
+        """
+        Args:
+            name: 阶段名称
+            profile: 为 False 时即使开启了性能分析也只计时（阶段的工作在其他进程中）
+        """
+        if self.profile_dir and profile:
+            with self._profiled(name):
+                yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._done(name, time.perf_counter() - start)
+
+    def _done(self, name, elapsed):
+        self.phases.append((name, elapsed))
+        self.log(f"{name}用时 {elapsed:.2f} 秒")
+
+    @contextmanager
+    def _profiled(self, name):
+        import cProfile
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            self._done(name, elapsed)
+            try:
+                path = self._write_report(name, elapsed, profiler, before, after, peak)
+                self.log(f"{name}的性能分析已写入 {path}")
+            except OSError as e:
+                self.log(f"无法写入{name}的性能分析: {e}")
+
+    def _write_report(self, name, elapsed, profiler, before, after, peak):
+        import pstats
+
+        slug = re.sub(r"[^\w]+", "_", name)
+        stem = os.path.join(self._session_dir(), f"{len(self.phases):02d}-{slug}")
+        profiler.dump_stats(stem + ".prof")
+
+        out = io.StringIO()
+        out.write(f"{name}: {elapsed:.3f} 秒，内存峰值 {peak / 1024 / 1024:.1f} MB\n\n")
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        out.write("\n新增内存最多的代码行:\n")
+        for stat in after.compare_to(before, "lineno")[:15]:
+            out.write(f"  {stat}\n")
+        with open(stem + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return stem + ".txt"
+
+    def _session_dir(self):
+        if self.session_dir is None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, self.session_name)
+            k = 1
+            while True:
+                try:
+                    os.mkdir(path)
+                    break
+                except FileExistsError:
+                    k += 1
+                    path = os.path.join(self.profile_dir, f"{self.session_name}-{k}")
+            self.session_dir = path
+        return self.session_dir
+
+    def summary(self):
+        total = sum(elapsed for _, elapsed in self.phases)
+        parts = "，".join(f"{name} {elapsed:.2f}" for name, elapsed in self.phases)
+        return f"启动共用时 {total:.2f} 秒（{parts}）"
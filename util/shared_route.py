@@ -0,0 +1,245 @@
+"""
+共享内存中的路径
+
+多个模拟进程跑同一条路径时，由一个进程解析路径文件并规划好未加偏移的基准轨迹，
+写入 multiprocessing.shared_memory；其他进程按名字只读映射，不再各自读取、转换
+和加密路径。每圈（SharedLap）不复制基准轨迹，只保存几个随机偏移和步长，发送某个
+tick 时才从共享内存中插值出位置并叠加偏移，因此每个会话的内存与路径长度无关。
+
+目前只有 tools/loadtest.py 这类同时运行多个会话的工具会发布共享路径；GUI 和守护模式
+只有一个引擎进程，直接读取路径文件，但都可以把 shm://名字 当作路径文件传给引擎。
+
+内存布局（小端）：
+
+    头部  magic(4s) version(I) 路径点数(I) 基准点数(I) 基准点间距(d)
+    数据  路径 [lat, lng] * 路径点数，基准轨迹 [lat, lng] * 基准点数，均为 float64
+"""
+import os
+import sys
+import math
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+MAGIC = b"IRRT"
+VERSION = 1
+HEADER = struct.Struct("<4sIIId")
+SCHEME = "shm://"
+
+
+def _attach(name):
+    """只读映射已有的共享内存，不让本进程退出时把它删掉"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        # Python 3.13 之前映射已有的共享内存也会登记到 resource_tracker，进程退出时会被删掉
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedRoute:
+    """共享内存中的一条路径及其基准轨迹"""
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, version, route_count, base_count, spacing = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} 不是路径共享内存")
+        self.spacing = spacing
+        data = shm.buf[HEADER.size:HEADER.size + (route_count + base_count) * 16].toreadonly().cast('d')
+        self._data = data
+        self._route_count = route_count
+        self._base_count = base_count
+        self._coordinates = None
+        self._center = None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def url(self):
+        """可以代替路径文件名传给引擎的地址"""
+        return SCHEME + self.shm.name
+
+    @classmethod
+    def publish(cls, coordinates, spacing=1.0, name=None):
+        """
+        把路径及其基准轨迹写入新的共享内存
+
+        Args:
+            coordinates: 坐标列表（一圈，不需要重复起点）
+            spacing: 基准轨迹相邻点的直线距离（米），接近实际步长时重新采样最快
+            name: 共享内存名，默认自动生成
+
+        Returns:
+            SharedRoute（创建者，close 时删除共享内存）
+        """
+        from util.trajectory import resample
+
+        if len(coordinates) < 2:
+            raise ValueError("路径至少需要 2 个点")
+        base, _ = resample(coordinates + [coordinates[0]], spacing, 1.0)
+        size = HEADER.size + (len(coordinates) + len(base)) * 16
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, len(coordinates), len(base), spacing)
+        values = [x for p in coordinates for x in (p["lat"], p["lng"])]
+        values += [x for p in base for x in (p["lat"], p["lng"])]
+        struct.pack_into(f"<{len(values)}d", shm.buf, HEADER.size, *values)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """按名字（或 shm:// 地址）只读映射已发布的路径"""
+        if name.startswith(SCHEME):
+            name = name[len(SCHEME):]
+        return cls(_attach(name), owner=False)
+
+    def _points(self, start, count):
+        data = self._data
+        return [{"lat": data[2 * i], "lng": data[2 * i + 1]} for i in range(start, start + count)]
+
+    def coordinates(self):
+        """路径坐标，与发布时相同（只有路径本身的几十到几百个点，每个进程转换一次）"""
+        if self._coordinates is None:
+            self._coordinates = self._points(0, self._route_count)
+        return self._coordinates
+
+    def center(self):
+        """基准轨迹的中心，随机偏移沿从中心出发的方向（与 run.randLoc 相同）"""
+        if self._center is None:
+            start = 2 * self._route_count
+            values = self._data[start:start + 2 * self._base_count]
+            self._center = (sum(values[::2]) / self._base_count, sum(values[1::2]) / self._base_count)
+        return self._center
+
+    def lap(self, v, dt, end, n=5, d=0.000025):
+        """
+        在基准轨迹上规划一圈
+
+        与 run.planLap 一样把一圈分成 n 段，每段沿径向叠加一个不超过 d（度）的随机偏移，
+        再在加了偏移的轨迹上按速度 v 步进，相邻两个 tick 的直线距离恰好为 v·dt。
+        规划时逐点计算加偏移后的基准轨迹，只保留每个 tick 在基准轨迹上的位置（8 字节）。
+
+        Args:
+            v: 速度（米/秒），或者按 tick 序号返回速度的函数
+            dt: 发送间隔（秒）
+            end: 一圈的终点（下一圈的起点），不包含在结果中
+            n: 随机偏移的段数
+            d: 随机偏移的幅度（度）
+
+        Returns:
+            (未加偏移的位置序列, 实际发送的位置序列)，均为 SharedLap，长度相同、下标一一对应
+        """
+        import random
+        from util.trajectory import resample_positions
+
+        offsets = array("d", ((2 * random.random() - 1) * d for _ in range(n)))
+        ticks = SharedLap(self, None, end, offsets)
+        positions, _ = resample_positions(_Vertices(ticks), v, dt)
+        positions = array("d", (k + t for k, t in positions))
+        return SharedLap(self, positions, end, None), SharedLap(self, positions, end, offsets)
+
+    def close(self):
+        """解除映射；创建者同时删除共享内存（之后不能再使用由它规划的 SharedLap）"""
+        self._data.release()
+        self.shm.close()
+        if self.owner:
+            if os.name == "posix" and sys.version_info < (3, 13):
+                # 同一 resource_tracker 下的子进程映射后会注销这条登记（见 _attach），
+                # 先补登记，unlink 注销时 tracker 才不会报 KeyError；已登记时没有影响
+                from multiprocessing import resource_tracker
+                resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedLap:
+    """
+    共享内存中基准轨迹上的一圈，由 SharedRoute.lap 创建
+
+    与位置列表一样支持 len、下标（含切片）和迭代，下标 i 为第 i 个 tick 的位置；
+    只保存每个 tick 在基准轨迹上的位置（基准点下标 + 比例）和各段的随机偏移，取点时才计算。
+    基准轨迹最后一个点之后是 end，这一小段不加偏移。
+    """
+
+    def __init__(self, route, positions, end, offsets):
+        self.route = route
+        self.positions = positions
+        self.end = end
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.at(f) for f in self.positions[i]]
+        return self.at(self.positions[i])
+
+    def __iter__(self):
+        for f in self.positions:
+            yield self.at(f)
+
+    def vertex(self, k):
+        """加偏移后的第 k 个基准点，k 等于基准点数时为 end"""
+        route = self.route
+        if k >= route._base_count:
+            return self.end["lat"], self.end["lng"]
+        data = route._data
+        j = 2 * (route._route_count + k)
+        lat, lng = data[j], data[j + 1]
+        if self.offsets:
+            n = len(self.offsets)
+            count = route._base_count
+            segment = min(k * n // count, n - 1)
+            start = segment * count // n
+            stop = (segment + 1) * count // n
+            w = self.offsets[segment] * math.sin((k - start) / (stop - start) * math.pi) ** 2
+            c_lat, c_lng = route.center()
+            r = math.hypot(lat - c_lat, lng - c_lng)
+            if r:
+                lat += (lat - c_lat) / r * w
+                lng += (lng - c_lng) / r * w
+        return lat, lng
+
+    def at(self, f):
+        """基准轨迹上位置 f（第 int(f) 个点之后的比例 f - int(f)）处的坐标"""
+        k = int(f)
+        t = f - k
+        lat, lng = self.vertex(k)
+        if t:
+            lat2, lng2 = self.vertex(k + 1)
+            lat += t * (lat2 - lat)
+            lng += t * (lng2 - lng)
+        return {"lat": lat, "lng": lng}
+
+
+class _Vertices:
+    """把 SharedLap 的基准点（含 end）当作只读的坐标列表，供 resample_positions 步进"""
+
+    def __init__(self, lap):
+        self.lap = lap
+        self.count = lap.route._base_count + 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.count
+        lat, lng = self.lap.vertex(k)
+        return {"lat": lat, "lng": lng}
+
+    def __iter__(self):
+        for k in range(self.count):
+            lat, lng = self.lap.vertex(k)
+            yield {"lat": lat, "lng": lng}
@@ -0,0 +1,233 @@
+"""
+路径库的空间索引与几何查询
+
+GridIndex 按固定经纬度网格划分，每条路径按包围盒登记到覆盖的所有网格中，
+适合校园尺度、数量在几千条以内的路径库。
+"""
+import math
+import random
+import heapq
+
+from util.geometry import project, EARTH_RADIUS
+
+METERS_PER_DEGREE = math.pi / 180.0 * EARTH_RADIUS
+
+
+def bounding_box(coordinates):
+    """
+    计算包围盒
+
+    Returns:
+        (min_lat, min_lng, max_lat, max_lng)
+    """
+    lats = [p["lat"] for p in coordinates]
+    lngs = [p["lng"] for p in coordinates]
+    return (min(lats), min(lngs), max(lats), max(lngs))
+
+
+def bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def bbox_gap(a, b):
+    """
+    两个包围盒各边的最大偏差（米）
+
+    若结果大于阈值，两条路径的 Hausdorff/Fréchet 距离必然也大于阈值，
+    可用于在精确计算前快速排除。
+    """
+    lat = (a[0] + a[2] + b[0] + b[2]) / 4.0
+    kx = math.cos(math.radians(lat)) * METERS_PER_DEGREE
+    return max(
+        abs(a[0] - b[0]) * METERS_PER_DEGREE,
+        abs(a[2] - b[2]) * METERS_PER_DEGREE,
+        abs(a[1] - b[1]) * kx,
+        abs(a[3] - b[3]) * kx,
+    )
+
+
+def point_to_route_distance(lat, lng, coordinates):
+    """点到路径折线（首尾相连）的最短距离（米）"""
+    origin = {"lat": lat, "lng": lng}
+    xy = project(coordinates, origin=origin)
+    if len(xy) == 1:
+        return math.hypot(*xy[0])
+    best = math.inf
+    for i in range(len(xy)):
+        ax, ay = xy[i]
+        bx, by = xy[(i + 1) % len(xy)]
+        dx = bx - ax
+        dy = by - ay
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length2))
+        best = min(best, math.hypot(ax + t * dx, ay + t * dy))
+    return best
+
+
+def _directed_hausdorff(a, b, limit):
+    """
+    a 到 b 的有向 Hausdorff 距离
+
+    采用提前终止算法：一旦某点找到比当前最大值更近的对应点就跳过，
+    随机打乱后平均复杂度接近线性。超过 limit 时立即返回。
+    """
+    result = 0.0
+    for ax, ay in a:
+        nearest = math.inf
+        for bx, by in b:
+            d = (ax - bx) ** 2 + (ay - by) ** 2
+            if d < nearest:
+                nearest = d
+                if nearest <= result:
+                    break
+        if nearest > result:
+            result = nearest
+            if result > limit:
+                break
+    return result
+
+
+def hausdorff_distance(route_a, route_b, limit=math.inf):
+    """
+    两条路径坐标点之间的 Hausdorff 距离（米）
+
+    Args:
+        route_a, route_b: 坐标列表
+        limit: 超过该值时提前返回（返回值仍大于 limit）
+    """
+    origin = route_a[0]
+    a = project(route_a, origin=origin)
+    b = project(route_b, origin=origin)
+    rng = random.Random(0)
+    rng.shuffle(a)
+    rng.shuffle(b)
+    limit2 = limit * limit
+    d = _directed_hausdorff(a, b, limit2)
+    if d <= limit2:
+        d = max(d, _directed_hausdorff(b, a, limit2))
+    return math.sqrt(d)
+
+
+def frechet_distance(route_a, route_b):
+    """
+    两条路径的离散 Fréchet 距离（米）
+
+    与 Hausdorff 不同，Fréchet 距离考虑点的先后顺序，
+    可以区分方向相反的同一条路线。使用滚动数组，内存为 O(len(route_b))。
+    """
+    origin = route_a[0]
+    a = project(route_a, origin=origin)
+    b = project(route_b, origin=origin)
+    m = len(b)
+    prev = [0.0] * m
+    for i, (ax, ay) in enumerate(a):
+        cur = [0.0] * m
+        for j, (bx, by) in enumerate(b):
+            d = math.hypot(ax - bx, ay - by)
+            if i == 0 and j == 0:
+                cur[j] = d
+            elif i == 0:
+                cur[j] = max(cur[j - 1], d)
+            elif j == 0:
+                cur[j] = max(prev[0], d)
+            else:
+                cur[j] = max(min(prev[j], prev[j - 1], cur[j - 1]), d)
+        prev = cur
+    return prev[-1]
+
+
+class GridIndex:
+    """固定网格空间索引"""
+
+    def __init__(self, cell_size: float = 0.01):
+        """
+        Args:
+            cell_size: 网格边长（度），默认约 1 公里
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        self.boxes = {}
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def _cells_for(self, bbox):
+        lat0, lng0 = self._cell(bbox[0], bbox[1])
+        lat1, lng1 = self._cell(bbox[2], bbox[3])
+        for i in range(lat0, lat1 + 1):
+            for j in range(lng0, lng1 + 1):
+                yield (i, j)
+
+    def insert(self, key, bbox):
+        if key in self.boxes:
+            self.remove(key)
+        self.boxes[key] = bbox
+        for cell in self._cells_for(bbox):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        bbox = self.boxes.pop(key, None)
+        if bbox is None:
+            return
+        for cell in self._cells_for(bbox):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def query_bbox(self, bbox):
+        """返回包围盒与 bbox 相交的所有键"""
+        result = set()
+        for cell in self._cells_for(bbox):
+            for key in self.cells.get(cell, ()):
+                if key not in result and bbox_intersects(self.boxes[key], bbox):
+                    result.add(key)
+        return result
+
+    def nearest(self, lat, lng, k, distance_fn, max_distance=math.inf):
+        """
+        由近到远查找 k 个键
+
+        从查询点所在网格向外逐圈扩展：第 r 圈之外的对象距离至少为
+        r 个网格边长，当已找到的 k 个结果都在该下界之内时停止。
+
+        Args:
+            distance_fn: key -> 精确距离（米）
+            max_distance: 最大距离（米）
+
+        Returns:
+            [(distance, key), ...] 按距离升序
+        """
+        if not self.cells:
+            return []
+        ci, cj = self._cell(lat, lng)
+        rows = [c[0] for c in self.cells]
+        cols = [c[1] for c in self.cells]
+        max_ring = max(abs(ci - min(rows)), abs(max(rows) - ci),
+                       abs(cj - min(cols)), abs(max(cols) - cj))
+        cell_m = self.cell_size * METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+
+        seen = set()
+        found = []
+        for r in range(max_ring + 1):
+            for i in range(ci - r, ci + r + 1):
+                for j in range(cj - r, cj + r + 1):
+                    if max(abs(i - ci), abs(j - cj)) != r:
+                        continue
+                    for key in self.cells.get((i, j), ()):
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        d = distance_fn(key)
+                        if d <= max_distance:
+                            found.append((d, key))
+            bound = r * cell_m
+            if bound > max_distance:
+                break
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= bound:
+                break
+        return heapq.nsmallest(k, found)
@@ -0,0 +1,185 @@
+"""
+轨迹规划
+
+把路径按固定时间间隔采样成逐 tick 发送的位置序列。相邻两个 tick 之间的直线距离
+恰好等于 v·dt（在弯道处沿折线求与圆的交点，而不是沿弧长等分），因此手机按相邻
+定位点计算出的速度在任何时间窗口内都与目标速度一致，不受线段长短和拐角的影响。
+"""
+import math
+
+from util.geometry import project
+
+
+def march(coordinates, step, start=None):
+    """
+    沿折线按直线距离步进
+
+    Args:
+        coordinates: 坐标列表（开放折线）
+        step: 步长（米），或者按步序号返回步长的函数
+        start: 起点在折线上的位置 (线段下标, 比例)，默认从第一个点开始
+
+    Returns:
+        (位置列表 [(线段下标, 比例), ...], 最后一个位置到终点的直线距离)
+    """
+    xy = project(coordinates)
+    n = len(xy)
+    k, t = start or (0, 0.0)
+    positions = [(k, t)]
+    px, py = _at(xy, k, t)
+    step_at = step if callable(step) else (lambda i: step)
+    while True:
+        r = step_at(len(positions) - 1)
+        if r <= 0:
+            raise ValueError(f"步长必须为正数: {r}")
+        r2 = r * r
+        # 从当前位置向后找第一条终点落在以 P 为圆心、r 为半径的圆外的线段
+        for j in range(k, n - 1):
+            bx, by = xy[j + 1]
+            if (bx - px) ** 2 + (by - py) ** 2 >= r2:
+                t = _circle_exit(xy[j], xy[j + 1], px, py, r, t if j == k else 0.0)
+                k = j
+                break
+        else:
+            ex, ey = xy[-1]
+            return positions, math.hypot(ex - px, ey - py)
+        positions.append((k, t))
+        px, py = _at(xy, k, t)
+
+
+def _at(xy, k, t):
+    if k >= len(xy) - 1:
+        return xy[-1]
+    (ax, ay), (bx, by) = xy[k], xy[k + 1]
+    return ax + t * (bx - ax), ay + t * (by - ay)
+
+
+def _circle_exit(a, b, px, py, r, t0):
+    """线段 a→b 上比例不小于 t0、且与 P 距离为 r 的点（线段终点在圆外）"""
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    fx = a[0] - px
+    fy = a[1] - py
+    qa = dx * dx + dy * dy
+    if qa == 0:
+        return 1.0
+    qb = 2 * (fx * dx + fy * dy)
+    qc = fx * fx + fy * fy - r * r
+    disc = max(qb * qb - 4 * qa * qc, 0.0)
+    t = (-qb + math.sqrt(disc)) / (2 * qa)
+    return min(1.0, max(t0, t))
+
+
+def _interpolate(coordinates, positions):
+    result = []
+    last = len(coordinates) - 1
+    for k, t in positions:
+        a = coordinates[min(k, last)]
+        b = coordinates[min(k + 1, last)]
+        result.append({"lat": a["lat"] + t * (b["lat"] - a["lat"]), "lng": a["lng"] + t * (b["lng"] - a["lng"])})
+    return result
+
+
+def resample(coordinates, v, dt, iterations=8):
+    """
+    按速度 v 把开放折线采样为间隔 dt 的位置序列
+
+    终点不包含在结果中（它是下一圈或下一段的起点）。所有步长会按同一比例
+    做微小调整，使最后一个点到终点的距离也等于一步，跨圈时速度不会突变。
+
+    Args:
+        coordinates: 坐标列表
+        v: 速度（米/秒），或者按 tick 序号返回速度的函数
+        dt: 时间间隔（秒）
+        iterations: 调整步长的最多次数
+
+    Returns:
+        (位置序列, 速度的调整比例)
+    """
+    if len(coordinates) < 2:
+        return [c.copy() for c in coordinates[:1]], 1.0
+    positions, scale = resample_positions(coordinates, v, dt, iterations)
+    return _interpolate(coordinates, positions), scale
+
+
+def resample_positions(coordinates, v, dt, iterations=8):
+    """
+    与 resample 相同，但返回折线上的位置 [(线段下标, 比例), ...] 而不是坐标
+
+    coordinates 只需支持 len、下标和迭代，至少 2 个点。
+
+    Returns:
+        (位置列表, 速度的调整比例)
+    """
+    speed_at = v if callable(v) else (lambda k: v)
+
+    def attempt(scale):
+        positions, rest = march(coordinates, lambda k: speed_at(k) * dt * scale)
+        last = speed_at(len(positions) - 1) * dt * scale
+        # 以步数计的路径长度
+        return positions, rest, last, len(positions) - 1 + rest / last
+
+    scale = 1.0
+    positions, rest, last, steps = attempt(scale)
+    # 取整后固定步数，再调整比例使最后一步也恰好是一整步
+    count = max(1, round(steps))
+    best = (abs(steps - count), scale, positions, rest, last)
+    lo = hi = None  # 步数偏多 / 偏少时的比例
+    for _ in range(iterations):
+        if best[0] < 1e-3:
+            break
+        if steps > count:
+            lo = scale
+        else:
+            hi = scale
+        # 拐角处步数随步长不连续变化，先按比例调整，夹住解之后二分
+        scale = (lo + hi) / 2 if lo is not None and hi is not None else scale * steps / count
+        positions, rest, last, steps = attempt(scale)
+        if abs(steps - count) < best[0]:
+            best = (abs(steps - count), scale, positions, rest, last)
+    _, scale, positions, rest, last = best
+    if rest < last / 2 and len(positions) > 1:
+        positions.pop()
+    return positions, scale
+
+
+def path_length(points):
+    """折线的长度（米，平面近似）"""
+    xy = project(points)
+    return sum(math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(xy, xy[1:]))
+
+
+def speed_profile(points, dt, target=None, window=5):
+    """
+    统计位置序列的实际速度
+
+    Args:
+        points: 按 dt 间隔发送的位置（可以在末尾附上下一圈的起点）
+        dt: 时间间隔（秒）
+        target: 目标速度，给出时统计最大偏差
+        window: 统计窗口的 tick 数
+
+    Returns:
+        {"ticks", "distance", "duration", "mean", "min", "max", "max_deviation"}
+        min/max 为所有长度为 window 的滑动窗口内的平均速度
+    """
+    xy = project(points)
+    steps = [math.hypot(x2 - x1, y2 - y1) for (x1, y1), (x2, y2) in zip(xy, xy[1:])]
+    report = {"ticks": len(steps), "distance": sum(steps), "duration": len(steps) * dt}
+    if not steps:
+        report.update(mean=0.0, min=0.0, max=0.0, max_deviation=None)
+        return report
+    report["mean"] = report["distance"] / report["duration"]
+    w = min(window, len(steps))
+    total = sum(steps[:w])
+    lo = hi = total
+    for i in range(w, len(steps)):
+        total += steps[i] - steps[i - w]
+        lo = min(lo, total)
+        hi = max(hi, total)
+    report["min"] = lo / (w * dt)
+    report["max"] = hi / (w * dt)
+    report["max_deviation"] = None if target is None else max(
+        abs(report["min"] - target), abs(report["max"] - target)
+    ) / target
+    return report